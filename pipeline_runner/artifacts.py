@@ -1,17 +1,21 @@
-import io
+import itertools
 import logging
 import os.path
+import posixpath
 import tarfile
+from collections.abc import Iterator
 from tarfile import TarInfo
-from time import time as ts
+from threading import Thread
 from uuid import UUID
 
 from .config import config
 from .container import ContainerRunner
-from .utils import FileStreamer, get_human_readable_size, safe_extract_tar
+from .utils import FileStreamer, Timer, get_human_readable_size, safe_extract_tar
 
 logger = logging.getLogger(__name__)
 
+ARTIFACT_CHUNK_SIZE = 1024 * 1024
+
 
 class ArtifactManager:
     def __init__(self, container: ContainerRunner, artifact_directory: str, step_uuid: UUID) -> None:
@@ -22,68 +26,108 @@ class ArtifactManager:
     def upload(self) -> None:
         logger.info("Loading artifacts")
 
-        t = ts()
+        timer = Timer()
 
-        tar_data = io.BytesIO()
+        res = self._container.put_archive(config.build_dir, self._stream_artifacts())
+        if not res:
+            raise Exception(f"Error loading artifacts from {self._artifact_directory}")
 
-        with tarfile.open(fileobj=tar_data, mode="w|") as tar:
-            for root, _, files in os.walk(self._artifact_directory):
-                for af in files:
-                    full_path = os.path.join(root, af)
+        logger.info("Artifacts loaded in %.3fs", timer.elapsed)
 
-                    relpath = os.path.relpath(full_path, self._artifact_directory)
-                    ti = TarInfo(relpath)
+    def _stream_artifacts(self) -> Iterator[bytes]:
+        # The archive is written by a separate thread into a pipe and sent to docker as it is produced, instead of
+        # being built in memory first, so the memory usage doesn't depend on the size of the artifacts.
+        read_fd, write_fd = os.pipe()
+        errors: list[BaseException] = []
 
-                    stat = os.stat(full_path)
-                    ti.size = stat.st_size
-                    ti.mode = stat.st_mode
+        def write_archive() -> None:
+            try:
+                with os.fdopen(write_fd, "wb") as w, tarfile.open(fileobj=w, mode="w|") as tar:
+                    self._add_artifacts(tar)
+            except BaseException as e:  # noqa: BLE001
+                errors.append(e)
 
-                    with open(full_path, "rb") as f:
-                        tar.addfile(ti, f)
+        writer = Thread(target=write_archive, name="artifact-upload", daemon=True)
+        writer.start()
 
-        res = self._container.put_archive(config.build_dir, tar_data.getvalue())
-        if not res:
-            raise Exception(f"Error loading artifact: {af}")
+        with os.fdopen(read_fd, "rb") as r:
+            while chunk := r.read(ARTIFACT_CHUNK_SIZE):
+                yield chunk
+
+        writer.join()
+        if errors:
+            raise errors[0]
+
+    def _add_artifacts(self, tar: tarfile.TarFile) -> None:
+        for root, _, files in os.walk(self._artifact_directory):
+            for af in files:
+                full_path = os.path.join(root, af)
 
-        t = ts() - t
+                relpath = os.path.relpath(full_path, self._artifact_directory)
+                ti = TarInfo(relpath)
 
-        logger.info("Artifacts loaded in %.3fs", t)
+                stat = os.stat(full_path)
+                ti.size = stat.st_size
+                ti.mode = stat.st_mode
+
+                with open(full_path, "rb") as f:
+                    tar.addfile(ti, f)
 
     def download(self, artifacts: list[str]) -> None:
         if not artifacts:
             return
 
-        artifact_file = f"artifacts-{self._step_uuid}.tar"
-        artifact_remote_path = os.path.join(config.build_dir, artifact_file)
+        artifact_list_file = posixpath.join(config.temp_dir, f"artifacts-{self._step_uuid}.txt")
         artifact_local_directory = self._artifact_directory
 
         logger.info("Collecting artifacts")
 
-        t = ts()
+        timer = Timer()
 
+        # The archive is streamed from tar's stdout instead of being written in the container and fetched with
+        # `get_archive`, which would wrap it in a second archive. Some tar implementations refuse to create an empty
+        # archive, so tar is only called if something matched. Errors from find are ignored, as they were when it was
+        # piped into tar. The file list is removed on exit, whether tar succeeded or not.
         path_filters = " -o ".join(f"-path './{a}'" for a in artifacts)
-        prepare_artifacts_cmd = ["find", "-type", "f", r"\(", path_filters, r"\)"]
-        prepare_artifacts_cmd += ["|", "tar", "cf", artifact_file, "-C", config.build_dir, "-T", "-"]
-
-        self._container.run_command(prepare_artifacts_cmd)
-        if not self._container.path_exists(artifact_remote_path):
-            logger.info("No artifacts found. Skipping")
+        collect_artifacts_script = [
+            f"trap 'rm -f {artifact_list_file}' EXIT",
+            rf"find -type f \( {path_filters} \) > {artifact_list_file} || true",
+            f"if [ -s {artifact_list_file} ]; then tar cf - -C {config.build_dir} -T {artifact_list_file}; fi",
+        ]
+
+        output = self._container.stream_command_output("\n".join(collect_artifacts_script))
+
+        size = 0
+
+        def count_size(chunks: Iterator[bytes]) -> Iterator[bytes]:
+            nonlocal size
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+
+        # A failure to collect the artifacts doesn't fail the step, it is only reported.
+        try:
+            first_chunk = next(output, None)
+            if first_chunk is None:
+                logger.info("No artifacts found. Skipping")
+                return
+
+            data = count_size(itertools.chain([first_chunk], output))
+
+            # FileStreamer only implements `read` which is all that is needed.
+            with tarfile.open(fileobj=FileStreamer(data), mode="r|") as tar:  # type: ignore[abstract]
+                safe_extract_tar(tar, artifact_local_directory)
+
+            # The reader stops at the end of the archive, consume what's left so that the exit code is checked.
+            for _ in data:
+                pass
+        except Exception as e:  # noqa: BLE001
+            logger.warning("Error collecting artifacts: %s", e)
             return
 
-        data, stats = self._container.get_archive(artifact_remote_path, encode_stream=True)
-        logger.debug("artifacts stats: %s", stats)
-
-        # FileStreamer only implements `read` which is all that is needed.
-        with tarfile.open(fileobj=FileStreamer(data), mode="r|") as wrapper_tar:  # type: ignore[abstract]
-            for entry in wrapper_tar:
-                with tarfile.open(fileobj=wrapper_tar.extractfile(entry), mode="r|") as tar:
-                    safe_extract_tar(tar, artifact_local_directory)
-
-        t = ts() - t
-
         logger.info(
             "Artifacts saved %s to %s in %.3fs",
-            get_human_readable_size(stats["size"]),
+            get_human_readable_size(size),
             artifact_local_directory,
-            t,
+            timer.elapsed,
         )
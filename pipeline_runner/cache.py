@@ -6,7 +6,6 @@ from collections.abc import Mapping
 from datetime import datetime, timedelta
 from functools import lru_cache
 from tempfile import NamedTemporaryFile
-from time import time as ts
 
 from . import utils
 from .config import config
@@ -93,7 +92,7 @@ class CacheRestore:
 
         logger.info("Cache '%s': Uploading", self._cache_name)
 
-        t = ts()
+        timer = utils.Timer()
 
         prepare_cache_dir_cmd = (
             f'[ -d "{remote_cache_directory}" ] && rm -rf "{remote_cache_directory}"; '
@@ -109,10 +108,11 @@ class CacheRestore:
             if not success:
                 raise Exception(f"Error uploading cache: {self._cache_name}")
 
-        t = ts() - t
-
         logger.info(
-            "Cache '%s': Uploaded %s in %.3fs", self._cache_name, utils.get_human_readable_size(cache_archive_size), t
+            "Cache '%s': Uploaded %s in %.3fs",
+            self._cache_name,
+            utils.get_human_readable_size(cache_archive_size),
+            timer.elapsed,
         )
 
     def _restore_cache(self) -> None:
@@ -121,7 +121,7 @@ class CacheRestore:
 
         logger.info("Cache '%s': Restoring", self._cache_name)
 
-        t = ts()
+        timer = utils.Timer()
 
         restore_cache_script = [
             f'if [ -e "{target_dir}" ]; then rm -rf "{target_dir}"; fi',
@@ -133,9 +133,7 @@ class CacheRestore:
         if exit_code != 0:
             raise Exception(f"Error restoring cache: {self._cache_name}: {output.decode()}")
 
-        t = ts() - t
-
-        logger.info("Cache '%s': Restored in %.3fs", self._cache_name, t)
+        logger.info("Cache '%s': Restored in %.3fs", self._cache_name, timer.elapsed)
 
 
 class NullCacheRestore(CacheRestore):
@@ -210,7 +208,7 @@ class CacheSave:
 
         logger.info("Cache '%s': Preparing", self._cache_name)
 
-        t = ts()
+        timer = utils.Timer()
 
         prepare_cache_cmd = f'if [ -e "{remote_dir}" ]; then mv "{remote_dir}" "{target_dir}"; fi'
 
@@ -218,9 +216,7 @@ class CacheSave:
         if exit_code != 0:
             raise Exception(f"Error preparing cache: {self._cache_name}: {output.decode()}")
 
-        t = ts() - t
-
-        logger.info("Cache '%s': Prepared in %.3fs", self._cache_name, t)
+        logger.info("Cache '%s': Prepared in %.3fs", self._cache_name, timer.elapsed)
 
         return target_dir
 
@@ -231,7 +227,7 @@ class CacheSave:
 
         logger.info("Cache '%s': Downloading", self._cache_name)
 
-        t = ts()
+        timer = utils.Timer()
 
         with NamedTemporaryFile(dir=self._local_cache_directory, delete=False) as f:
             try:
@@ -249,9 +245,9 @@ class CacheSave:
                 logger.debug("Moving temp cache archive %s to %s", f.name, dst)
                 os.rename(f.name, dst)
 
-        t = ts() - t
-
-        logger.info("Cache '%s': Downloaded %s in %.3fs", self._cache_name, utils.get_human_readable_size(size), t)
+        logger.info(
+            "Cache '%s': Downloaded %s in %.3fs", self._cache_name, utils.get_human_readable_size(size), timer.elapsed
+        )
 
 
 class NullCacheSave(CacheSave):
@@ -3,6 +3,7 @@ import logging.config
 import os
 import shutil
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from importlib.metadata import version
 
 import click
@@ -13,7 +14,6 @@ from pipeline_runner.errors import InvalidPipelineError
 from . import utils
 from .config import config
 from .parse import parse_pipeline_file
-from .runner import PipelineRunner, PipelineRunRequest
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +43,19 @@ def _prompt_for_pipeline(pipeline_file: str) -> str | None:
     return pipeline
 
 
+def _parse_variables(_ctx: click.Context, _param: click.Parameter, values: tuple[str, ...]) -> dict[str, str]:
+    variables = {}
+
+    for value in values:
+        name, sep, var_value = value.partition("=")
+        if not sep or not name:
+            raise click.BadParameter(f"expected NAME=VALUE, got: {value}")
+
+        variables[name] = var_value
+
+    return variables
+
+
 @click.group("Pipeline Runner", invoke_without_command=True)
 @click.option(
     "-V",
@@ -83,6 +96,15 @@ def main(ctx: click.Context, *, show_version: bool) -> None:
     multiple=True,
     help="Read in a file of environment variables. Can be specified multiple times.",
 )
+@click.option(
+    "-v",
+    "--var",
+    "variables",
+    multiple=True,
+    callback=_parse_variables,
+    metavar="NAME=VALUE",
+    help="Value of a pipeline variable, instead of prompting for it. Can be specified multiple times.",
+)
 @click.option(
     "-c",
     "--color/--no-color",
@@ -100,15 +122,28 @@ def main(ctx: click.Context, *, show_version: bool) -> None:
     default=False,
     help="Expose the local ssh agent to the container. Default: False",
 )
+@click.option(
+    "--parse-cache/--no-parse-cache",
+    default=True,
+    help="Cache the parsed pipelines file between runs. Default: True",
+)
+@click.option(
+    "--prefetch-images/--no-prefetch-images",
+    default=True,
+    help="Pull the images of all the steps in the background when the pipeline starts. Default: True",
+)
 def run(
     pipeline: str | None,
     repository_path: str,
     steps: list[str],
     env_files: list[str],
+    variables: dict[str, str],
     *,
     color: bool,
     cpu_limits: bool,
     expose_ssh_agent: bool,
+    parse_cache: bool,
+    prefetch_images: bool,
 ) -> None:
     """
     Run the pipeline <PIPELINE>.
@@ -118,6 +153,8 @@ def run(
     config.color = color
     config.cpu_limits = cpu_limits
     config.expose_ssh_agent = expose_ssh_agent
+    config.parse_cache = parse_cache
+    config.prefetch_images = prefetch_images
 
     _init_logger()
 
@@ -128,10 +165,14 @@ def run(
         logger.error("pipeline not specified")
         sys.exit(2)
 
-    req = PipelineRunRequest(pipeline, repository_path, steps, env_files)
+    # The runner pulls in docker and everything needed to run a pipeline, which the other commands don't need.
+    from .runner import PipelineRunner, PipelineRunRequest  # noqa: PLC0415
+
+    req = PipelineRunRequest(pipeline, repository_path, steps, env_files, variables)
 
-    runner = PipelineRunner(req)
     try:
+        # Creating the runner connects to the docker daemon, which can fail as well.
+        runner = PipelineRunner(req)
         runner.run()
     except Exception:
         logger.exception("Error running pipeline")
@@ -195,13 +236,16 @@ def cache(action: str) -> None:
     if not os.path.isdir(cache_dir):
         return
 
-    projects = sorted(os.listdir(cache_dir))
+    with os.scandir(cache_dir) as entries:
+        projects = sorted(e.name for e in entries if e.is_dir())
+
     if action == "list":
         click.echo("Caches:")
         click.echo("\n".join(f"\t{p}" for p in projects))
-    elif action == "clear":
-        for p in projects:
-            shutil.rmtree(os.path.join(cache_dir, p))
+    elif action == "clear" and projects:
+        # Removing a cache is mostly waiting on the filesystem, so the projects are cleared concurrently.
+        with ThreadPoolExecutor(max_workers=min(len(projects), 32), thread_name_prefix="cache-clear") as executor:
+            list(executor.map(shutil.rmtree, (os.path.join(cache_dir, p) for p in projects)))
 
 
 if __name__ == "__main__":
@@ -47,6 +47,8 @@ class Config(BaseSettings):
     color: bool = True
     cpu_limits: bool = False
     expose_ssh_agent: bool = False
+    parse_cache: bool = False
+    prefetch_images: bool = True
 
     username: str = Field(default_factory=getpass.getuser)
 
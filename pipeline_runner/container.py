@@ -1,4 +1,5 @@
 import base64
+import codecs
 import io
 import logging
 import os.path
@@ -11,10 +12,10 @@ from dataclasses import dataclass
 from importlib.resources import as_file, files
 from io import BufferedReader
 from logging import Logger
-from time import time
+from threading import Lock
+from time import perf_counter, time
 from typing import Any, cast
 
-import boto3
 import docker.errors  # type: ignore[import-untyped]
 from docker import DockerClient
 from docker.constants import DEFAULT_DATA_CHUNK_SIZE  # type: ignore[import-untyped]
@@ -24,7 +25,7 @@ import pipeline_runner
 
 from .config import ATLASSIAN_DOCKER_CLI_VERSION, config
 from .models import Image, Pipe
-from .utils import escape_shell_string, stringify, wrap_in_shell
+from .utils import escape_shell_string, wrap_in_shell
 
 _group_separator = 0x1D
 GROUP_SEPARATOR = chr(_group_separator)
@@ -38,6 +39,7 @@ PipelineScript = Sequence[str | Pipe]
 class ContainerRunner:
     def __init__(
         self,
+        docker_client: DockerClient,
         name: str,
         image: Image,
         network_name: str | None,
@@ -58,7 +60,7 @@ class ContainerRunner:
         self._mem_limit = mem_limit * 2**20  # MiB to B
         self._ssh_private_key = ssh_private_key
 
-        self._client = docker.from_env()
+        self._client = docker_client
         self._container = None
 
     def start(self) -> None:
@@ -101,6 +103,17 @@ class ContainerRunner:
         logger.info("Removing container: %s", self._container.name)
         self._container.remove(v=True, force=True)
 
+    def kill(self) -> None:
+        if not self._container:
+            return
+
+        logger.info("Killing container: %s", self._container.name)
+        try:
+            self._container.kill()
+        except docker.errors.APIError as e:
+            # The container already exited or was removed.
+            logger.debug("Unable to kill container %s: %s", self._container.name, e)
+
     def run_script(
         self,
         script: Sequence[str | Pipe],
@@ -118,8 +131,7 @@ class ContainerRunner:
             # TODO: Refactor
             raise Exception("called on uninitialized container")
 
-        command = stringify(command)
-
+        # Without a shell, a list is passed to docker as-is so that it becomes the argv of the process.
         if shell:
             command = wrap_in_shell(command)
 
@@ -128,6 +140,33 @@ class ContainerRunner:
 
         return self._container.exec_run(command, user=user)
 
+    def stream_command_output(self, command: str | list[str], user: int | str | None = None) -> Iterator[bytes]:
+        """
+        Run a command in a shell and yield its stdout as it is produced.
+
+        An exception is raised once the output is exhausted if the command failed.
+        """
+        if not self._container:
+            # TODO: Refactor
+            raise Exception("called on uninitialized container")
+
+        api = self._client.api
+        exec_id = api.exec_create(
+            self._container.id, wrap_in_shell(command), stdout=True, stderr=True, user="" if user is None else str(user)
+        )["Id"]
+
+        stderr_chunks = []
+        for stdout, stderr in api.exec_start(exec_id, stream=True, demux=True):
+            if stderr:
+                stderr_chunks.append(stderr)
+            if stdout:
+                yield stdout
+
+        exit_code = api.exec_inspect(exec_id)["ExitCode"]
+        if exit_code:
+            error_output = b"".join(stderr_chunks).decode(errors="replace")
+            raise Exception(f"Command failed with exit code {exit_code}: {error_output}")
+
     def path_exists(self, path: str) -> bool:
         ret, _ = self.run_command(f'[ -e "$(realpath "{path}")" ]')
         return cast(int, ret) == 0
@@ -143,7 +182,7 @@ class ContainerRunner:
         return self._container.get_archive(path, chunk_size, encode_stream)
 
     # TODO: Validate Typing
-    def put_archive(self, path: str, data: BufferedReader | bytes) -> bool:
+    def put_archive(self, path: str, data: BufferedReader | bytes | Iterable[bytes]) -> bool:
         if not self._container:
             # TODO: Refactor
             raise Exception("called on uninitialized container")
@@ -209,7 +248,7 @@ class ContainerRunner:
             config.ssh_key_dir,
         ]
 
-        exit_code, output = self.run_command(mkdir_cmd, user=0)
+        exit_code, output = self.run_command(mkdir_cmd, user=0, shell=False)
         if exit_code != 0:
             raise Exception(f"Error creating required directories: {output}")
 
@@ -334,13 +373,19 @@ class ContainerScriptRunner:
         self._print_execution_log(output_stream)
 
     def _print_execution_log(self, output_stream: Iterator[tuple[bytes, bytes]]) -> None:
+        stdout_decoder = _get_output_decoder()
+        stderr_decoder = _get_output_decoder()
+
         for stdout, stderr in output_stream:
-            if stdout:
-                self._stdout_print(stdout.decode().replace(GROUP_SEPARATOR, ""))
-            if stderr:
-                self._stderr_print(stderr.decode())
+            if stdout and (text := stdout_decoder.decode(stdout)):
+                self._stdout_print(text.replace(GROUP_SEPARATOR, ""))
+            if stderr and (text := stderr_decoder.decode(stderr)):
+                self._stderr_print(text)
+
+        if text := stderr_decoder.decode(b"", final=True):
+            self._stderr_print(text)
 
-        self._stdout_print("\n")
+        self._stdout_print(stdout_decoder.decode(b"", final=True).replace(GROUP_SEPARATOR, "") + "\n")
 
     def _get_exit_code_of_command(self, exit_code_file_path: str) -> int:
         meta_exit_code, output = self._container.exec_run(["/bin/cat", exit_code_file_path])
@@ -370,23 +415,36 @@ class ContainerScriptRunnerWithExecTime(ContainerScriptRunner):
         self._timestamp: float | None = None
 
     def _print_execution_log(self, output_stream: Iterator[tuple[bytes, bytes]]) -> None:
+        stdout_decoder = _get_output_decoder()
+        stderr_decoder = _get_output_decoder()
+
         for stdout, stderr in output_stream:
             if stdout:
-                chunks = iter(stdout.decode().split(GROUP_SEPARATOR))
+                self._print_stdout_with_timing(stdout_decoder.decode(stdout))
+            if stderr and (text := stderr_decoder.decode(stderr)):
+                self._stderr_print(text)
 
-                self._stdout_print(next(chunks))
-
-                for c in chunks:
-                    self._print_timing()
-                    self._stdout_print(c)
-            if stderr:
-                self._stderr_print(stderr.decode())
+        self._print_stdout_with_timing(stdout_decoder.decode(b"", final=True))
+        if text := stderr_decoder.decode(b"", final=True):
+            self._stderr_print(text)
 
         self._print_timing()
 
+    def _print_stdout_with_timing(self, text: str) -> None:
+        if not text:
+            return
+
+        chunks = iter(text.split(GROUP_SEPARATOR))
+
+        self._stdout_print(next(chunks))
+
+        for c in chunks:
+            self._print_timing()
+            self._stdout_print(c)
+
     def _print_timing(self) -> None:
-        now = time()
-        if self._timestamp:
+        now = perf_counter()
+        if self._timestamp is not None:
             self._stdout_print(f"\n>>> Execution time: {now - self._timestamp:.3f}s\n\n")
 
         self._timestamp = now
@@ -436,17 +494,21 @@ class RemoteActionManager:
 
     def _prepare_for_remote_execution(self, script: list[str]) -> RemoteScript:
         traced_script = self._add_traces_to_script(script)
-        exit_code_file_path = posixpath.join(config.temp_dir, f"exit_code-{uuid.uuid4().hex}")
 
-        sh_script_name = f"shell_script-{uuid.uuid4().hex}.sh"
+        # The files of a single remote script only need to be unique as a group.
+        script_id = uuid.uuid4().hex
+
+        exit_code_file_path = posixpath.join(config.temp_dir, f"exit_code-{script_id}")
+
+        sh_script_name = f"shell_script-{script_id}.sh"
         sh_script_path = posixpath.join(config.scripts_dir, sh_script_name)
         sh_script = self._wrap_script_in_posix_shell(traced_script)
 
-        bash_script_name = f"bash_script-{uuid.uuid4().hex}.sh"
+        bash_script_name = f"bash_script-{script_id}.sh"
         bash_script_path = posixpath.join(config.scripts_dir, bash_script_name)
         bash_script = self._wrap_script_in_bash(traced_script)
 
-        wrapper_script_name = f"wrapper_script-{uuid.uuid4().hex}.sh"
+        wrapper_script_name = f"wrapper_script-{script_id}.sh"
         wrapper_script_path = posixpath.join(config.scripts_dir, wrapper_script_name)
         wrapper_script = self._make_wrapper_script(sh_script_path, bash_script_path, exit_code_file_path)
 
@@ -520,14 +582,44 @@ class RemoteActionManager:
             raise Exception("Error uploading scripts to container")
 
 
+def _get_output_decoder() -> codecs.IncrementalDecoder:
+    # Output chunks can end in the middle of a multibyte character, the decoder keeps it until the next chunk.
+    return codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+
 _pulled_images = set()
+# Parallel steps and services can ask for the same image at the same time, only one of them should pull it.
+_image_pull_locks: dict[str, Lock] = {}
 
 
 def pull_image(client: DockerClient, image: Image) -> None:
-    if image.name in _pulled_images:
-        logger.info("Image already pulled: %s", image.name)
-        return
+    with _image_pull_locks.setdefault(image.name, Lock()):
+        if image.name in _pulled_images:
+            logger.info("Image already pulled: %s", image.name)
+            return
+
+        if _is_pinned_image_available_locally(client, image):
+            logger.info("Image pinned by digest already exists locally: %s", image.name)
+        else:
+            _pull_image(client, image)
+
+        _pulled_images.add(image.name)
 
+
+def _is_pinned_image_available_locally(client: DockerClient, image: Image) -> bool:
+    # An image referenced by digest can't change on the remote, so a local copy is always up to date.
+    if "@sha256:" not in image.name:
+        return False
+
+    try:
+        client.images.get(image.name)
+    except docker.errors.ImageNotFound:
+        return False
+
+    return True
+
+
+def _pull_image(client: DockerClient, image: Image) -> None:
     logger.info("Pulling image: %s", image.name)
 
     auth_config = get_image_authentication(image)
@@ -544,7 +636,10 @@ def pull_image(client: DockerClient, image: Image) -> None:
         else:
             raise
 
-    _pulled_images.add(image.name)
+
+# ECR tokens are valid for hours, reuse them until shortly before they expire instead of asking for one on every pull.
+_ECR_TOKEN_EXPIRATION_MARGIN = 300
+_ecr_credentials: dict[tuple[str, str, str | None, str], tuple[dict[str, str], float]] = {}
 
 
 def get_image_authentication(image: Image) -> dict[str, str] | None:
@@ -554,6 +649,15 @@ def get_image_authentication(image: Image) -> dict[str, str] | None:
         aws_session_token = os.getenv("AWS_SESSION_TOKEN")
         aws_region = os.getenv("AWS_DEFAULT_REGION", "us-east-1")
 
+        cache_key = (aws_access_key_id, aws_secret_access_key, aws_session_token, aws_region)
+        if cached := _ecr_credentials.get(cache_key):
+            auth, expires_at = cached
+            if time() < expires_at:
+                return auth
+
+        # boto3 is slow to import and only needed for images hosted on ECR.
+        import boto3  # noqa: PLC0415
+
         client = boto3.client(
             "ecr",
             aws_access_key_id=aws_access_key_id,
@@ -563,15 +667,21 @@ def get_image_authentication(image: Image) -> dict[str, str] | None:
         )
 
         resp = client.get_authorization_token()
+        auth_data = resp["authorizationData"][0]
 
-        credentials = base64.b64decode(resp["authorizationData"][0]["authorizationToken"]).decode()
+        credentials = base64.b64decode(auth_data["authorizationToken"]).decode()
         username, password = credentials.split(":", maxsplit=1)
 
-        return {
+        auth = {
             "username": username,
             "password": password,
         }
 
+        if expires_at := auth_data.get("expiresAt"):
+            _ecr_credentials[cache_key] = (auth, expires_at.timestamp() - _ECR_TOKEN_EXPIRATION_MARGIN)
+
+        return auth
+
     if image.username and image.password:
         return {
             "username": image.username,
@@ -2,6 +2,7 @@ import logging
 import os
 import uuid
 from collections.abc import Mapping
+from functools import cached_property
 from typing import TYPE_CHECKING
 
 from dotenv import dotenv_values
@@ -10,7 +11,7 @@ from slugify import slugify
 from pipeline_runner.errors import InvalidPipelineError
 
 from . import utils
-from .config import DEFAULT_CACHES, DEFAULT_SERVICES
+from .config import DEFAULT_CACHES, DEFAULT_IMAGE, DEFAULT_SERVICES, config
 from .models import (
     CacheType,
     CloneSettings,
@@ -52,7 +53,7 @@ class PipelineRunContext:
         self.project_metadata = project_metadata
         self.repository = repository
         self.env_vars = env_vars or {}
-        self.selected_steps = selected_steps or []
+        self.selected_steps = frozenset(selected_steps or [])
 
         self.pipeline_uuid = uuid.uuid4()
         self.pipeline_variables: dict[str, str] = {}
@@ -97,11 +98,12 @@ class PipelineRunContext:
         envvars.update(dotenv_values(".env"))
 
         for env_file in env_files:
-            if not os.path.exists(env_file):
-                raise ValueError(f"Invalid env file: {env_file}")
-
             logger.debug("Loading env file: %s", env_file)
-            envvars.update(dotenv_values(env_file))
+            try:
+                with open(env_file, encoding="utf-8") as f:
+                    envvars.update(dotenv_values(stream=f))
+            except OSError:
+                raise ValueError(f"Invalid env file: {env_file}") from None
 
         sanitized_env_vars = {k: v or "" for k, v in envvars.items()}
 
@@ -134,6 +136,46 @@ class PipelineRunContext:
 
         return all_caches
 
+    # These variables are the same for every step of the pipeline, only compute them once.
+    @cached_property
+    def bitbucket_env_vars(self) -> Mapping[str, str]:
+        project_slug = self.project_metadata.slug
+
+        return {
+            "CI": "true",
+            "BUILD_DIR": config.build_dir,
+            "BITBUCKET_BRANCH": self.repository.get_current_branch(),
+            "BITBUCKET_BUILD_NUMBER": str(self.project_metadata.build_number),
+            "BITBUCKET_PROJECT_KEY": self.project_metadata.key,
+            "BITBUCKET_PROJECT_UUID": str(self.project_metadata.project_uuid),
+            "BITBUCKET_CLONE_DIR": config.build_dir,
+            "BITBUCKET_COMMIT": self.repository.get_current_commit(),
+            "BITBUCKET_PIPELINE_UUID": str(self.pipeline_uuid),
+            "BITBUCKET_REPO_FULL_NAME": f"{project_slug}/{project_slug}",
+            "BITBUCKET_REPO_IS_PRIVATE": "true",
+            "BITBUCKET_REPO_OWNER": config.username,
+            "BITBUCKET_REPO_OWNER_UUID": str(self.project_metadata.owner_uuid),
+            "BITBUCKET_REPO_SLUG": project_slug,
+            "BITBUCKET_REPO_UUID": str(self.project_metadata.repo_uuid),
+            "BITBUCKET_WORKSPACE": project_slug,
+        }
+
+    def is_step_selected(self, step: Step) -> bool:
+        if not self.selected_steps:
+            # No step selection means we run everything
+            return True
+
+        return step.name in self.selected_steps
+
+    def get_step_image(self, step: Step) -> Image:
+        if step.image:
+            return step.image
+
+        if self.default_image:
+            return self.default_image
+
+        return Image(name=DEFAULT_IMAGE)
+
     def get_log_directory(self) -> str:
         return utils.ensure_directory(os.path.join(self._data_directory, "logs"))
 
@@ -167,6 +209,10 @@ class StepRunContext:
         if (parallel_step_index is None) != (parallel_step_count is None):
             raise ValueError("`parallel_step_index` and `parallel_step_count` must be both defined or both undefined")
 
+        if parallel_step_index is not None:
+            # Parallel steps run at the same time and may share a name, their containers must not.
+            self.slug = f"{self.slug}-{parallel_step_index}"
+
         self.parallel_step_index = parallel_step_index
         self.parallel_step_count = parallel_step_count
 
@@ -3,6 +3,7 @@ from collections.abc import Iterator, Sequence
 from enum import Enum
 from pathlib import Path
 from string import Template
+from threading import Lock
 from typing import Any, Generic, SupportsIndex, TypeVar
 from uuid import UUID, uuid4
 
@@ -307,11 +308,16 @@ class StepWrapper(BaseModel):
 
 class ParallelSteps(ListWrapper[StepWrapper]):
     wrapped: list[StepWrapper] = Field(alias="steps", min_length=1)
+    fail_fast: bool | None = Field(None, alias="fail-fast")
 
 
 class ParallelStep(BaseModel):
     parallel: list[StepWrapper] | ParallelSteps = Field(min_length=1)
 
+    @property
+    def fail_fast(self) -> bool:
+        return isinstance(self.parallel, ParallelSteps) and bool(self.parallel.fail_fast)
+
     def expand_env_vars(self, variables: dict[str, str]) -> None:
         for s in self.parallel:
             s.expand_env_vars(variables)
@@ -488,11 +494,25 @@ class Repository:
         self.path = path
         self._git_repo = Repo(path)
 
+        # The branch and commit can't change during a run but are needed by every step, so only ask git once.
+        # The lock keeps parallel steps from talking to git at the same time.
+        self._lock = Lock()
+        self._current_branch: str | None = None
+        self._current_commit: str | None = None
+
     def get_current_branch(self) -> str:
-        return self._git_repo.active_branch.name
+        with self._lock:
+            if self._current_branch is None:
+                self._current_branch = self._git_repo.active_branch.name
+
+            return self._current_branch
 
     def get_current_commit(self) -> str:
-        return self._git_repo.head.commit.hexsha
+        with self._lock:
+            if self._current_commit is None:
+                self._current_commit = self._git_repo.head.commit.hexsha
+
+            return self._current_commit
 
 
 class PipelineResult:
@@ -1,23 +1,109 @@
+import json
+import logging
 import os.path
+import stat
+import tempfile
+from functools import lru_cache
+from typing import Any
 
 import yaml
 from pydantic import ValidationError
 from yaml.parser import ParserError
 
+from . import utils
+from .config import config
 from .errors import PipelinesFileNotFoundError, PipelinesFileParseError, PipelinesFileValidationError
 from .models import PipelineSpec
 
+logger = logging.getLogger(__name__)
+
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:  # pragma: no cover
+    from yaml import SafeLoader as YamlLoader  # type: ignore[assignment]
+
+    logger.warning("libyaml is not available, parsing the pipelines file will be slower")
+
+PARSE_CACHE_FILE_NAME = "pipelines-file.json"
+
 
 def parse_pipeline_file(file_path: str) -> PipelineSpec:
-    if not os.path.isfile(file_path):
+    # A single stat both checks that the file exists and gives the key of the parse cache.
+    try:
+        file_stat = os.stat(file_path)
+    except OSError:
+        raise PipelinesFileNotFoundError(file_path) from None
+
+    if not stat.S_ISREG(file_stat.st_mode):
         raise PipelinesFileNotFoundError(file_path)
 
     try:
-        with open(file_path) as f:
-            pipelines_data = yaml.safe_load(f)
+        pipelines_data = _load_pipeline_file(os.path.abspath(file_path), file_stat.st_mtime_ns, file_stat.st_size)
 
         return PipelineSpec.model_validate(pipelines_data)
     except ParserError as e:
         raise PipelinesFileParseError(str(e)) from e
     except ValidationError as e:
         raise PipelinesFileValidationError(str(e)) from e
+
+
+# The modification time and size are only there to invalidate the cache when the file changes. The raw data is cached
+# rather than the spec because the spec gets modified when expanding the environment variables.
+@lru_cache(maxsize=8)
+def _load_pipeline_file(file_path: str, mtime_ns: int, size: int) -> Any:  # noqa: ANN401
+    if not config.parse_cache:
+        return _read_pipeline_file(file_path)
+
+    project_path_slug = utils.hashify_path(os.path.dirname(file_path))
+    cache_file = os.path.join(utils.get_project_cache_directory(project_path_slug), PARSE_CACHE_FILE_NAME)
+    cache_key = [file_path, mtime_ns, size]
+
+    try:
+        with open(cache_file, encoding="utf-8") as f:
+            cache = json.load(f)
+
+        if cache["key"] == cache_key:
+            logger.debug("Using cached pipelines file: %s", cache_file)
+            return cache["data"]
+    except FileNotFoundError:
+        pass
+    except Exception as e:  # noqa: BLE001
+        logger.debug("Ignoring invalid pipelines file cache %s: %s", cache_file, e)
+
+    pipelines_data = _read_pipeline_file(file_path)
+
+    _write_cache_file(cache_file, {"key": cache_key, "data": pipelines_data})
+
+    return pipelines_data
+
+
+def _read_pipeline_file(file_path: str) -> Any:  # noqa: ANN401
+    # Read the whole file at once instead of letting the parser pull it in small chunks. Passing bytes also lets the
+    # parser detect the encoding itself instead of depending on the locale.
+    with open(file_path, "rb") as f:
+        data = f.read()
+
+    return yaml.load(data, Loader=YamlLoader)
+
+
+def _write_cache_file(cache_file: str, value: Any) -> None:  # noqa: ANN401
+    # YAML can hold values that JSON can't represent as-is, like dates or non-string keys. Such a file isn't cached
+    # rather than being cached with different data.
+    try:
+        serialized = json.dumps(value)
+    except (TypeError, ValueError) as e:
+        logger.debug("Unable to cache the pipelines file: %s", e)
+        return
+
+    if json.loads(serialized) != value:
+        logger.debug("Unable to cache the pipelines file: it doesn't round-trip through JSON")
+        return
+
+    # Write to a temporary file first so that a concurrent run never reads a partially written cache.
+    try:
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=os.path.dirname(cache_file), delete=False) as f:
+            f.write(serialized)
+
+        os.replace(f.name, cache_file)
+    except OSError as e:
+        logger.debug("Unable to write pipelines file cache %s: %s", cache_file, e)
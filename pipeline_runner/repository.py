@@ -1,5 +1,7 @@
 import logging
-from typing import TypeVar, cast
+from typing import TypeVar
+
+from docker import DockerClient  # type: ignore[import-untyped]
 
 from .config import config
 from .models import CloneSettings, Image, Repository
@@ -13,6 +15,7 @@ T = TypeVar("T")
 class RepositoryCloner:
     def __init__(
         self,
+        docker_client: DockerClient,
         repository: Repository,
         step_clone_settings: CloneSettings,
         global_clone_settings: CloneSettings,
@@ -22,9 +25,8 @@ class RepositoryCloner:
         data_volume_name: str,
         output_logger: logging.Logger,
     ) -> None:
+        self._client = docker_client
         self._repository = repository
-        self._step_clone_settings = step_clone_settings
-        self._global_clone_settings = global_clone_settings
         self._environment = environment
         self._user = str(user) if user is not None else None
         self._name = f"{parent_container_name}-clone"
@@ -33,16 +35,31 @@ class RepositoryCloner:
 
         self._container = None
 
+        # The step settings take precedence over the global ones, which take precedence over the defaults.
+        default_clone_settings = CloneSettings()
+        self._should_clone = bool(
+            self._first_non_none_value(
+                step_clone_settings.enabled, global_clone_settings.enabled, default_clone_settings.enabled
+            )
+        )
+        self._should_clone_lfs = bool(
+            self._first_non_none_value(step_clone_settings.lfs, global_clone_settings.lfs, default_clone_settings.lfs)
+        )
+        self._clone_depth = self._first_non_none_value(
+            step_clone_settings.depth, global_clone_settings.depth, default_clone_settings.depth
+        )
+
     def clone(self) -> None:
         # TODO: Fix cyclic import
         from .container import ContainerRunner
 
-        if not self._should_clone():
+        if not self._should_clone:
             logger.info("Clone disabled: skipping")
             return
 
         image = Image(name="alpine/git", run_as_user=self._user)
         runner = ContainerRunner(
+            self._client,
             self._name,
             image,
             None,
@@ -55,7 +72,9 @@ class RepositoryCloner:
 
         try:
             exec_result = runner.run_command(
-                f"git config --system --add safe.directory '{config.remote_workspace_dir}/.git'", user=0
+                ["git", "config", "--system", "--add", "safe.directory", f"{config.remote_workspace_dir}/.git"],
+                user=0,
+                shell=False,
             )
             if exec_result.exit_code:
                 raise Exception("Error setting up repository")
@@ -92,14 +111,14 @@ class RepositoryCloner:
     def _get_clone_command(self, origin: str) -> str:
         git_clone_cmd = []
 
-        if not self._should_clone_lfs():
+        if not self._should_clone_lfs:
             git_clone_cmd += ["GIT_LFS_SKIP_SMUDGE=1"]
 
         # TODO: Add `retry n`
         branch = self._repository.get_current_branch()
         git_clone_cmd += ["git", "clone", f"--branch='{branch}'"]
 
-        clone_depth = self._get_clone_depth()
+        clone_depth = self._clone_depth
         if clone_depth:
             git_clone_cmd += ["--depth", str(clone_depth)]
 
@@ -107,33 +126,6 @@ class RepositoryCloner:
 
         return " ".join(git_clone_cmd)
 
-    def _should_clone(self) -> bool:
-        return bool(
-            self._first_non_none_value(
-                self._step_clone_settings.enabled,
-                self._global_clone_settings.enabled,
-                CloneSettings().enabled,
-            )
-        )
-
-    def _should_clone_lfs(self) -> bool:
-        return bool(
-            self._first_non_none_value(
-                self._step_clone_settings.lfs,
-                self._global_clone_settings.lfs,
-                CloneSettings().lfs,
-            )
-        )
-
-    def _get_clone_depth(self) -> str | int | None:
-        depth = self._first_non_none_value(
-            self._step_clone_settings.depth,
-            self._global_clone_settings.depth,
-            CloneSettings().depth,
-        )
-
-        return cast(str | int | None, depth)
-
     @staticmethod
     def _first_non_none_value(*args: T | None) -> T | None:
         return next((v for v in args if v is not None), None)
@@ -1,19 +1,22 @@
 import logging
 import os
 import sys
+import threading
 from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from functools import cached_property
 from http import HTTPStatus
-from time import time as ts
 
 import docker  # type: ignore[import-untyped]
-from docker.errors import APIError  # type: ignore[import-untyped]
+from docker import DockerClient
+from docker.errors import APIError, NotFound  # type: ignore[import-untyped]
 from docker.models.networks import Network  # type: ignore[import-untyped]
 
 from . import utils
 from .artifacts import ArtifactManager
 from .cache import CacheManager
-from .config import DEFAULT_IMAGE, config
-from .container import ContainerRunner
+from .config import config
+from .container import ContainerRunner, pull_image
 from .context import PipelineRunContext, StepRunContext
 from .models import (
     Image,
@@ -31,6 +34,10 @@ from .service import ServicesManager
 logger = logging.getLogger(__name__)
 
 
+class StepStoppedError(Exception):
+    pass
+
+
 class PipelineRunRequest:
     def __init__(
         self,
@@ -38,10 +45,12 @@ class PipelineRunRequest:
         repository_path: str | None = None,
         selected_steps: list[str] | None = None,
         env_files: list[str] | None = None,
+        variables: dict[str, str] | None = None,
     ) -> None:
         self.pipeline_name = pipeline_name
         self.selected_steps = selected_steps or []
         self.env_files = env_files or []
+        self.variables = variables or {}
         self.repository_path = os.path.abspath(repository_path or ".")
 
     @property
@@ -53,6 +62,9 @@ class PipelineRunner:
     def __init__(self, pipeline_run_request: PipelineRunRequest) -> None:
         self._ctx = PipelineRunContext.from_run_request(pipeline_run_request)
         self._pipeline = self._ctx.pipeline
+        self._provided_variables = pipeline_run_request.variables
+
+        self._docker_client = docker.from_env()
 
     def run(self) -> PipelineResult:
         logger.info("Running pipeline: %s", self._ctx.pipeline_name)
@@ -60,9 +72,12 @@ class PipelineRunner:
 
         self._ctx.pipeline_variables = self._ask_for_variables()
 
-        s = ts()
+        timer = utils.Timer()
+        if config.prefetch_images:
+            self._prefetch_images()
+
         exit_code = self._execute_pipeline()
-        logger.info("Pipeline '%s' executed in %.3fs.", self._ctx.pipeline_name, ts() - s)
+        logger.info("Pipeline '%s' executed in %.3fs.", self._ctx.pipeline_name, timer.elapsed)
 
         if exit_code:
             logger.error("Pipeline '%s': Failed", self._ctx.pipeline_name)
@@ -74,10 +89,26 @@ class PipelineRunner:
     def _ask_for_variables(self) -> dict[str, str]:
         pipeline_variables = {}
         for var in self._pipeline.get_variables():
-            pipeline_variables[var.name] = self._read_user_variable_from_stdin(var)
+            if var.name in self._provided_variables:
+                pipeline_variables[var.name] = self._validate_provided_variable(var, self._provided_variables[var.name])
+            else:
+                pipeline_variables[var.name] = self._read_user_variable_from_stdin(var)
+
+        for name in self._provided_variables.keys() - pipeline_variables.keys():
+            logger.warning("Ignoring variable not defined in pipeline: %s", name)
 
         return pipeline_variables
 
+    @staticmethod
+    def _validate_provided_variable(var: Variable, value: str) -> str:
+        # An empty value falls back to the default, like an empty answer to the prompt.
+        value = value or var.default or ""
+
+        if var.allowed_values and value not in var.allowed_values:
+            raise ValueError(f"Invalid value for {var.name}: {value}")
+
+        return value
+
     @classmethod
     def _read_user_variable_from_stdin(cls, var: Variable) -> str:
         default = var.default or ""
@@ -106,9 +137,47 @@ class PipelineRunner:
 
         return var.rstrip()
 
+    def _prefetch_images(self) -> None:
+        # Pull the images of the upcoming steps and services in the background so later steps don't have to wait on
+        # them. The steps still pull their images themselves, `pull_image` makes them wait for an ongoing prefetch.
+        # Pulls are network bound, so every image gets its own thread. They are daemon threads: a pull that is still
+        # running when the pipeline ends must not keep the process alive.
+        for image in self._get_pipeline_images():
+            threading.Thread(
+                target=self._prefetch_image, args=(image,), name=f"image-prefetch-{image.name}", daemon=True
+            ).start()
+
+    def _prefetch_image(self, image: Image) -> None:
+        try:
+            pull_image(self._docker_client, image)
+        except Exception as e:  # noqa: BLE001
+            logger.warning("Unable to prefetch image %s: %s", image.name, e)
+
+    def _get_pipeline_images(self) -> list[Image]:
+        images: dict[str, Image] = {}
+
+        for element in self._pipeline.get_steps():
+            steps = [s.step for s in element] if isinstance(element, ParallelStep) else [element.step]
+
+            for step in filter(self._ctx.is_step_selected, steps):
+                step_image = self._ctx.get_step_image(step)
+                images.setdefault(step_image.name, step_image)
+
+                for service_name in step.services:
+                    service = self._ctx.services.get(service_name)
+                    if service and service.image:
+                        images.setdefault(service.image.name, service.image)
+
+        return list(images.values())
+
     def _execute_pipeline(self) -> int:
         for step in self._pipeline.get_steps():
-            runner = StepRunnerFactory.get(step, self._ctx)
+            # Skipped steps are filtered out here so that no runner, log file or docker resource is created for them.
+            if isinstance(step, StepWrapper) and not self._ctx.is_step_selected(step.step):
+                logger.info("Skipping step: %s", step.name)
+                continue
+
+            runner = StepRunnerFactory.get(step, self._ctx, self._docker_client)
 
             exit_code = runner.run()
 
@@ -123,30 +192,26 @@ class BaseStepRunner(ABC):
     def run(self) -> int | None:
         """Run the step."""
 
+    @abstractmethod
+    def stop(self) -> None:
+        """Stop the step if it is running, or prevent it from running if it hasn't started yet."""
+
 
 class StepRunner(BaseStepRunner):
-    def __init__(self, step_run_context: StepRunContext) -> None:
+    def __init__(self, step_run_context: StepRunContext, docker_client: DockerClient) -> None:
         self._ctx = step_run_context
         self._step = step_run_context.step
 
-        self._docker_client = docker.from_env()
+        self._docker_client = docker_client
         self._services_manager: ServicesManager | None = None
         self._container_runner: ContainerRunner | None = None
 
         self._container_name = self._ctx.slug
         self._data_volume_name = f"{self._container_name}-data"
-        self._output_logger = utils.get_output_logger(
-            self._ctx.pipeline_ctx.get_log_directory(), f"{self._container_name}"
-        )
 
-    # TODO: Decomplexify
-    # C901: Too complex (>10)
-    # PLR0915: Too many statements (>50)
-    def run(self) -> int | None:  # noqa: C901, PLR0915
-        if not self._should_run():
-            logger.info("Skipping step: %s", self._step.name)
-            return None
+        self._stop_requested = threading.Event()
 
+    def run(self) -> int | None:
         logger.info("Running step: %s", self._step.name)
         logger.debug("Step ID: %s", self._ctx.step_uuid)
 
@@ -159,34 +224,44 @@ class StepRunner(BaseStepRunner):
         if self._step.trigger == Trigger.Manual:
             input("Press enter to run step ")
 
-        s = ts()
+        timer = utils.Timer()
 
         network = None
 
         exit_code: int
+        stopped = False
+
+        # Created here rather than in __init__ so that a step that never runs doesn't leave a log listener behind.
+        self._output_logger = utils.get_output_logger(
+            self._ctx.pipeline_ctx.get_log_directory(), f"{self._container_name}"
+        )
 
         try:
             if "docker" not in self._step.services and self._docker_is_needed():
                 logger.debug("Docker service is needed, but wasn't requested. Adding it.")
                 self._step.services.append("docker")
 
-            image = self._get_image()
+            image = self._image
             network = self._get_network()
             environment = self._get_step_env_vars()
 
             services_manager = ServicesManager(
+                self._docker_client,
                 self._step.services,
                 self._ctx.pipeline_ctx.services,
                 self._step.size.as_int(),
                 self._data_volume_name,
+                self._container_name,
                 self._ctx.pipeline_ctx.project_metadata.path_slug,
                 self._ctx.pipeline_ctx.get_cache_directory(),
+                self._ctx.parallel_step_index,
             )
             self._services_manager = services_manager
 
             mem_limit = self._get_build_container_memory_limit(services_manager.get_memory_usage())
 
             container_runner = ContainerRunner(
+                self._docker_client,
                 self._container_name,
                 image,
                 network.name,
@@ -201,6 +276,9 @@ class StepRunner(BaseStepRunner):
 
             container_runner.start()
 
+            # A stop requested while the container was being created couldn't kill it.
+            self._raise_if_stopped()
+
             services_manager.start_services(f"container:{container_runner.get_container_name()}")
 
             services = services_manager.get_services_containers()
@@ -217,9 +295,35 @@ class StepRunner(BaseStepRunner):
 
             self._build_teardown(exit_code)
         except Exception:
-            logger.exception("Error during pipeline execution")
+            # Killing the container of a stopped step makes it fail, that's not an error.
+            stopped = self._stop_requested.is_set()
+            if not stopped:
+                logger.exception("Error during pipeline execution")
             exit_code = 1
         finally:
+            self._release_resources(network)
+
+        if stopped:
+            logger.warning("Step '%s' stopped after %.3fs", self._step.name, timer.elapsed)
+            return None
+
+        logger.info("Step '%s' executed in %.3fs with exit code: %s", self._step.name, timer.elapsed, exit_code)
+
+        return exit_code
+
+    def stop(self) -> None:
+        """Stop the step, killing its build container if it is running."""
+        self._stop_requested.set()
+
+        if self._container_runner:
+            self._container_runner.kill()
+
+    def _raise_if_stopped(self) -> None:
+        if self._stop_requested.is_set():
+            raise StepStoppedError
+
+    def _release_resources(self, network: Network | None) -> None:
+        try:
             if self._services_manager:
                 self._services_manager.stop_services()
 
@@ -229,33 +333,27 @@ class StepRunner(BaseStepRunner):
             if network:
                 network.remove()
 
-            volume = next(iter(self._docker_client.volumes.list(filters={"name": self._data_volume_name})), None)
-            if volume:
-                logger.info("Removing volume: %s", volume.name)
-                volume.remove()
-
-        logger.info("Step '%s' executed in %.3fs with exit code: %s", self._step.name, ts() - s, exit_code)
-
-        return exit_code
-
-    def _should_run(self) -> bool:
-        if not self._ctx.pipeline_ctx.selected_steps:
-            # No step selection means we run everything
-            return True
-
-        return self._step.name in self._ctx.pipeline_ctx.selected_steps
+            self._remove_data_volume()
+        finally:
+            # Stopped last so that the output written while tearing down the step still ends up in its log.
+            utils.stop_output_logger(self._output_logger)
 
-    def _get_image(self) -> Image:
-        if self._step.image:
-            return self._step.image
+    def _remove_data_volume(self) -> None:
+        try:
+            volume = self._docker_client.volumes.get(self._data_volume_name)
+        except NotFound:
+            return
 
-        if self._ctx.pipeline_ctx.default_image:
-            return self._ctx.pipeline_ctx.default_image
+        logger.info("Removing volume: %s", volume.name)
+        volume.remove()
 
-        return Image(name=DEFAULT_IMAGE)
+    @cached_property
+    def _image(self) -> Image:
+        return self._ctx.pipeline_ctx.get_step_image(self._step)
 
     def _get_network(self) -> Network:
-        name = f"{self._ctx.pipeline_ctx.project_metadata.slug}-network"
+        # Parallel steps each tear down their own network, so it can't be shared between steps.
+        name = f"{self._container_name}-network"
         try:
             bridge_network = self._docker_client.networks.get(name)
         except APIError as e:
@@ -283,29 +381,8 @@ class StepRunner(BaseStepRunner):
         return env_vars
 
     def _get_bitbucket_env_vars(self) -> dict[str, str]:
-        project_slug = self._ctx.pipeline_ctx.project_metadata.slug
-        git_branch = self._ctx.pipeline_ctx.repository.get_current_branch()
-        git_commit = self._ctx.pipeline_ctx.repository.get_current_commit()
-
-        env_vars: dict[str, str] = {
-            "CI": "true",
-            "BUILD_DIR": config.build_dir,
-            "BITBUCKET_BRANCH": git_branch,
-            "BITBUCKET_BUILD_NUMBER": str(self._ctx.pipeline_ctx.project_metadata.build_number),
-            "BITBUCKET_PROJECT_KEY": self._ctx.pipeline_ctx.project_metadata.key,
-            "BITBUCKET_PROJECT_UUID": str(self._ctx.pipeline_ctx.project_metadata.project_uuid),
-            "BITBUCKET_CLONE_DIR": config.build_dir,
-            "BITBUCKET_COMMIT": git_commit,
-            "BITBUCKET_PIPELINE_UUID": str(self._ctx.pipeline_ctx.pipeline_uuid),
-            "BITBUCKET_REPO_FULL_NAME": f"{project_slug}/{project_slug}",
-            "BITBUCKET_REPO_IS_PRIVATE": "true",
-            "BITBUCKET_REPO_OWNER": config.username,
-            "BITBUCKET_REPO_OWNER_UUID": str(self._ctx.pipeline_ctx.project_metadata.owner_uuid),
-            "BITBUCKET_REPO_SLUG": project_slug,
-            "BITBUCKET_REPO_UUID": str(self._ctx.pipeline_ctx.project_metadata.repo_uuid),
-            "BITBUCKET_STEP_UUID": str(self._ctx.step_uuid),
-            "BITBUCKET_WORKSPACE": project_slug,
-        }
+        env_vars = dict(self._ctx.pipeline_ctx.bitbucket_env_vars)
+        env_vars["BITBUCKET_STEP_UUID"] = str(self._ctx.step_uuid)
 
         if self._ctx.is_parallel():
             env_vars["BITBUCKET_PARALLEL_STEP"] = str(self._ctx.parallel_step_index)
@@ -328,7 +405,7 @@ class StepRunner(BaseStepRunner):
             raise Exception("called on uninitialized runner")
 
         logger.info("Build setup: '%s'", self._step.name)
-        s = ts()
+        timer = utils.Timer()
 
         self._clone_repository()
         self._upload_artifacts()
@@ -342,13 +419,13 @@ class StepRunner(BaseStepRunner):
         self._output_logger.info("\n")
 
         self._output_logger.info("Images used:\n")
-        docker_image = self._docker_client.images.get(self._get_image().name)
+        docker_image = self._docker_client.images.get(self._image.name)
         self._output_logger.info("\tbuild: %s@%s\n", docker_image.tags[0].split(":")[0], docker_image.id)
         for name, container in self._services_manager.get_services_containers().items():
             self._output_logger.info("\t%s: %s@%s\n", name, container.image.tags[0].split(":")[0], container.image.id)
         self._output_logger.info("\n")
 
-        logger.info("Build setup finished in %.3fs: '%s'", ts() - s, self._step.name)
+        logger.info("Build setup finished in %.3fs: '%s'", timer.elapsed, self._step.name)
 
     def _upload_artifacts(self) -> None:
         if not self._container_runner:
@@ -374,9 +451,10 @@ class StepRunner(BaseStepRunner):
         cm.upload(self._step.caches)
 
     def _clone_repository(self) -> None:
-        image = self._get_image()
+        image = self._image
 
         rc = RepositoryCloner(
+            self._docker_client,
             self._ctx.pipeline_ctx.repository,
             self._step.clone_settings,
             self._ctx.pipeline_ctx.clone_settings,
@@ -390,13 +468,13 @@ class StepRunner(BaseStepRunner):
 
     def _build_teardown(self, exit_code: int) -> None:
         logger.info("Build teardown: '%s'", self._step.name)
-        s = ts()
+        timer = utils.Timer()
 
         self._download_caches(exit_code)
         self._download_artifacts()
         self._stop_services()
 
-        logger.info("Build teardown finished in %.3fs: '%s'", ts() - s, self._step.name)
+        logger.info("Build teardown finished in %.3fs: '%s'", timer.elapsed, self._step.name)
 
     def _download_caches(self, exit_code: int) -> None:
         if not self._container_runner:
@@ -430,35 +508,94 @@ class StepRunner(BaseStepRunner):
 
 
 class ParallelStepRunner(BaseStepRunner):
-    def __init__(self, parallel_step: ParallelStep, pipeline_run_context: PipelineRunContext) -> None:
+    def __init__(
+        self, parallel_step: ParallelStep, pipeline_run_context: PipelineRunContext, docker_client: DockerClient
+    ) -> None:
         self._parallel_step = parallel_step
         self._pipeline_ctx = pipeline_run_context
+        self._docker_client = docker_client
+
+        self._runners: list[BaseStepRunner] = []
 
     def run(self) -> int | None:
         return_code = 0
         step_count = len(self._parallel_step)
 
+        runners = self._runners
         for idx, s in enumerate(self._parallel_step):
-            runner = StepRunnerFactory.get(
-                s, self._pipeline_ctx, parallel_step_index=idx, parallel_step_count=step_count
+            if not self._pipeline_ctx.is_step_selected(s.step):
+                logger.info("Skipping step: %s", s.name)
+                continue
+
+            # The index and count are those of the whole parallel group, even if some of its steps are skipped.
+            runners.append(
+                StepRunnerFactory.get(
+                    s,
+                    self._pipeline_ctx,
+                    self._docker_client,
+                    parallel_step_index=idx,
+                    parallel_step_count=step_count,
+                )
             )
-            rc = runner.run()
+
+        if not runners:
+            return return_code
+
+        # Steps spend most of their time waiting on the docker daemon, so threads are enough to run them concurrently.
+        # Every step gets its own thread: they all run at the same time, like they do on Bitbucket.
+        return_codes: list[int | None] = [None] * len(runners)
+        with ThreadPoolExecutor(max_workers=len(runners), thread_name_prefix="parallel-step") as executor:
+            futures = {executor.submit(r.run): idx for idx, r in enumerate(runners)}
+
+            try:
+                for future in as_completed(futures):
+                    if future.cancelled():
+                        continue
+
+                    rc = future.result()
+                    return_codes[futures[future]] = rc
+
+                    if rc and self._parallel_step.fail_fast:
+                        logger.warning("Parallel step failed, stopping the other steps")
+                        self._stop_unfinished_steps(futures)
+            except BaseException:
+                # On Ctrl-C, leaving the executor would wait for every step to finish while their containers keep
+                # running. Stopping them first lets each step release its docker resources and return.
+                logger.warning("Parallel step interrupted, stopping its steps")
+                self.stop()
+                raise
+
+        # Codes are collected by index so that the result doesn't depend on which step finished last.
+        for rc in return_codes:
             if rc:
                 return_code = rc
 
         return return_code
 
+    def stop(self) -> None:
+        for runner in self._runners:
+            runner.stop()
+
+    def _stop_unfinished_steps(self, futures: dict[Future[int | None], int]) -> None:
+        for future, idx in futures.items():
+            # Steps that haven't started yet are cancelled, the running ones are stopped.
+            if not future.done() and not future.cancel():
+                self._runners[idx].stop()
+
 
 class StepRunnerFactory:
     @staticmethod
     def get(
         step: Step | StepWrapper | ParallelStep,
         pipeline_run_context: PipelineRunContext,
+        docker_client: DockerClient,
         parallel_step_index: int | None = None,
         parallel_step_count: int | None = None,
     ) -> BaseStepRunner:
         if isinstance(step, ParallelStep):
-            return ParallelStepRunner(step, pipeline_run_context)
+            return ParallelStepRunner(step, pipeline_run_context, docker_client)
 
         s = step.step if isinstance(step, StepWrapper) else step
-        return StepRunner(StepRunContext(s, pipeline_run_context, parallel_step_index, parallel_step_count))
+        return StepRunner(
+            StepRunContext(s, pipeline_run_context, parallel_step_index, parallel_step_count), docker_client
+        )
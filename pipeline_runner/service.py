@@ -1,8 +1,8 @@
 import logging
 from importlib.resources import as_file, files
 
-import docker  # type: ignore[import-untyped]
-from docker import DockerClient
+from docker import DockerClient  # type: ignore[import-untyped]
+from docker.errors import NotFound  # type: ignore[import-untyped]
 from docker.models.containers import Container  # type: ignore[import-untyped]
 from docker.models.volumes import Volume  # type: ignore[import-untyped]
 from slugify import slugify
@@ -29,20 +29,25 @@ class ServiceUnhealthyError(Exception):
 class ServicesManager:
     def __init__(
         self,
+        docker_client: DockerClient,
         service_names: list[str],
         service_definitions: dict[str, Service],
         memory_multiplier: int,
         shared_data_volume_name: str,
+        parent_container_name: str,
         repository_slug: str,
         pipeline_cache_directory: str,
+        parallel_step_index: int | None = None,
     ) -> None:
         self._services_by_name = self._get_services(service_names, service_definitions)
         self._memory_multiplier = memory_multiplier
         self._shared_data_volume_name = shared_data_volume_name
+        self._parent_container_name = parent_container_name
         self._repository_slug = repository_slug
         self._pipeline_cache_directory = pipeline_cache_directory
+        self._parallel_step_index = parallel_step_index
 
-        self._client = docker.from_env()
+        self._client = docker_client
 
         self._service_runners: dict[str, ServiceRunner] = {}
 
@@ -56,8 +61,10 @@ class ServicesManager:
                 service,
                 network_name,
                 self._shared_data_volume_name,
+                self._parent_container_name,
                 self._repository_slug,
                 self._pipeline_cache_directory,
+                self._parallel_step_index,
             )
             sr.start()
             self._service_runners[sr.slug] = sr
@@ -107,16 +114,20 @@ class ServiceRunner:
         service: Service,
         network_name: str,
         shared_data_volume_name: str,
+        parent_container_name: str,
         project_slug: str,
         pipeline_cache_directory: str,
+        parallel_step_index: int | None = None,
     ) -> None:
         self._client = docker_client
         self._service_name = service_name
         self._service = service
         self._network_name = network_name
         self._shared_data_volume_name = shared_data_volume_name
+        self._parent_container_name = parent_container_name
         self._project_slug = project_slug
         self._pipeline_cache_directory = pipeline_cache_directory
+        self._parallel_step_index = parallel_step_index
         self._container = None
 
         self._slug = slugify(self._service_name)
@@ -160,7 +171,7 @@ class ServiceRunner:
         pass
 
     def _get_container_name(self) -> str:
-        return f"{self._project_slug}-service-{self._slug}"
+        return f"{self._parent_container_name}-service-{self._slug}"
 
     def stop(self) -> None:
         if not self._container:
@@ -232,21 +243,18 @@ class DockerServiceRunner(ServiceRunner):
         }
 
     def _get_cache_volume(self) -> Volume:
-        label_name = "org.acidrain.pipeline_runner.project"
-        label_value = self._project_slug
-
-        volumes = self._client.volumes.list(filters={"label": f"{label_name}={label_value}"})
-
-        if not volumes:
-            volume = self._client.volumes.create(
-                f"{self._get_container_name()}-cache", labels={label_name: label_value}
+        # Steps that run one after the other share the project's docker cache. Parallel steps run their docker daemons
+        # at the same time and can't share a /var/lib/docker, so they get one cache per index in their group.
+        name = f"{self._project_slug}-service-{self._slug}-cache"
+        if self._parallel_step_index is not None:
+            name = f"{name}-{self._parallel_step_index}"
+
+        try:
+            return self._client.volumes.get(name)
+        except NotFound:
+            return self._client.volumes.create(
+                name, labels={"org.acidrain.pipeline_runner.project": self._project_slug}
             )
-        elif len(volumes) == 1:
-            volume = volumes[0]
-        else:
-            raise Exception("Found more than one cache volume")
-
-        return volume
 
     def _teardown(self) -> None:
         logger.info("Executing teardown for service: %s", self._service_name)
@@ -268,8 +276,10 @@ class ServiceRunnerFactory:
         service_def: Service,
         network_name: str,
         shared_data_volume_name: str,
+        parent_container_name: str,
         repository_slug: str,
         pipeline_cache_directory: str,
+        parallel_step_index: int | None = None,
     ) -> ServiceRunner:
         cls: type[ServiceRunner | DockerServiceRunner]
 
@@ -281,6 +291,8 @@ class ServiceRunnerFactory:
             service_def,
             network_name,
             shared_data_volume_name,
+            parent_container_name,
             repository_slug,
             pipeline_cache_directory,
+            parallel_step_index,
         )
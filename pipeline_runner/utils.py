@@ -5,7 +5,10 @@ import os
 import sys
 from collections.abc import Iterator
 from logging import Logger
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
 from tarfile import TarFile
+from time import perf_counter
 from typing import IO
 
 from cryptography.hazmat.primitives import serialization
@@ -20,6 +23,8 @@ logger = logging.getLogger(__name__)
 
 ONE_KB = 1024
 
+_output_log_listeners: dict[str, QueueListener] = {}
+
 
 def get_output_logger(output_directory: str, name: str) -> Logger:
     formatter = logging.Formatter("%(message)s")
@@ -32,14 +37,48 @@ def get_output_logger(output_directory: str, name: str) -> Logger:
     file_handler.setFormatter(formatter)
     file_handler.terminator = ""
 
+    # Writing to stdout and to the log file is done by a background thread so that
+    # streaming the container's output is never blocked by a slow terminal.
+    queue: SimpleQueue[logging.LogRecord] = SimpleQueue()
+    listener = QueueListener(queue, stream_handler, file_handler)
+    listener.start()
+
     output_logger = logging.getLogger(f"pipeline_runner_output.{name}")
-    output_logger.handlers.append(stream_handler)
-    output_logger.handlers.append(file_handler)
+    # Loggers are global, make sure one that was used before doesn't write each record more than once.
+    stop_output_logger(output_logger)
+    output_logger.addHandler(QueueHandler(queue))
     output_logger.setLevel("DEBUG")
+    output_logger.propagate = False
+
+    _output_log_listeners[output_logger.name] = listener
 
     return output_logger
 
 
+def stop_output_logger(output_logger: Logger) -> None:
+    listener = _output_log_listeners.pop(output_logger.name, None)
+    if not listener:
+        return
+
+    # Stopping the listener flushes all the records still in the queue.
+    listener.stop()
+
+    for handler in listener.handlers:
+        handler.close()
+
+    for handler in [h for h in output_logger.handlers if isinstance(h, QueueHandler)]:
+        output_logger.removeHandler(handler)
+
+
+class Timer:
+    def __init__(self) -> None:
+        self._start = perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return perf_counter() - self._start
+
+
 def get_cache_directory() -> str:
     return user_cache_dir(appname=APP_NAME)
 
@@ -57,8 +96,9 @@ def get_project_data_directory(project_path_slug: str) -> str:
 
 
 def ensure_directory(path: str) -> str:
-    if not os.path.exists(path):
-        os.makedirs(path)
+    # Parallel steps can race to create the same directory, so it's fine if it appeared since the check.
+    if not os.path.isdir(path):
+        os.makedirs(path, exist_ok=True)
 
     return path
 
@@ -148,22 +188,32 @@ class FileStreamer(IO[bytes]):
     def __init__(self, it: Iterator[bytes]) -> None:
         self._it = it
         self._chunk = b""
+        self._offset = 0
         self._has_more_data = True
 
-    def _grow_chunk(self) -> None:
-        self._chunk = self._chunk + next(self._it)
-
     def read(self, n: int = 512) -> bytes:
         if not self._has_more_data:
             return b""
 
-        try:
-            while len(self._chunk) < n:
-                self._grow_chunk()
-            rv = self._chunk[:n]
-            self._chunk = self._chunk[n:]
-        except StopIteration:
-            rv = self._chunk
-            self._has_more_data = False
+        # Chunks are consumed in place using an offset: rebuilding the remainder of the current
+        # chunk on every read would copy the whole chunk for each (usually much smaller) read.
+        parts = []
+        remaining = n
+
+        while remaining > 0:
+            if self._offset >= len(self._chunk):
+                try:
+                    self._chunk = next(self._it)
+                except StopIteration:
+                    self._has_more_data = False
+                    break
+
+                self._offset = 0
+                continue
+
+            part = self._chunk[self._offset : self._offset + remaining]
+            self._offset += len(part)
+            remaining -= len(part)
+            parts.append(part)
 
-        return rv
+        return b"".join(parts)
@@ -91,10 +91,9 @@ def project_cache_directory(user_cache_directory: Path, mocker: MockerFixture) -
     yield project_cache
 
     docker_client = docker.from_env()
-    cache_volume = next(
-        (v for v in docker_client.volumes.list() if v.name == "pipeline-runner-service-docker-cache"), None
-    )
-    if cache_volume:
+    for cache_volume in docker_client.volumes.list(
+        filters={"label": "org.acidrain.pipeline_runner.project=pipeline-runner"}
+    ):
         cache_volume.remove()
 
 
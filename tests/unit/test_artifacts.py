@@ -0,0 +1,110 @@
+import io
+import tarfile
+import uuid
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from unittest.mock import Mock
+
+import pytest
+from _pytest.logging import LogCaptureFixture
+
+from pipeline_runner.artifacts import ArtifactManager
+from pipeline_runner.config import config
+from pipeline_runner.container import ContainerRunner
+
+
+def test_upload_streams_the_artifacts_to_the_container(tmp_path: Path) -> None:
+    (tmp_path / "dist").mkdir()
+    (tmp_path / "dist" / "app.bin").write_bytes(b"\x00\xff" * 1024 * 1024)
+    (tmp_path / "report.txt").write_text("all good")
+
+    uploaded = io.BytesIO()
+
+    def put_archive(_: str, data: Iterable[bytes]) -> bool:
+        for chunk in data:
+            uploaded.write(chunk)
+        return True
+
+    container = Mock(ContainerRunner)
+    container.put_archive.side_effect = put_archive
+
+    ArtifactManager(container, tmp_path.as_posix(), uuid.uuid4()).upload()
+
+    container.put_archive.assert_called_once()
+    assert container.put_archive.call_args.args[0] == config.build_dir
+
+    uploaded.seek(0)
+    with tarfile.open(fileobj=uploaded, mode="r:") as tar:
+        files = {m.name: tar.extractfile(m).read() for m in tar.getmembers()}  # type: ignore[union-attr]
+
+    assert files == {"dist/app.bin": b"\x00\xff" * 1024 * 1024, "report.txt": b"all good"}
+
+
+def test_upload_fails_if_the_container_rejects_the_artifacts(tmp_path: Path) -> None:
+    (tmp_path / "report.txt").write_text("all good")
+
+    def put_archive(_: str, data: Iterable[bytes]) -> bool:
+        for _chunk in data:
+            pass
+        return False
+
+    container = Mock(ContainerRunner)
+    container.put_archive.side_effect = put_archive
+
+    with pytest.raises(Exception, match="Error loading artifacts"):
+        ArtifactManager(container, tmp_path.as_posix(), uuid.uuid4()).upload()
+
+
+def test_download_extracts_the_streamed_artifacts(tmp_path: Path) -> None:
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w") as tar:
+        content = b"all good"
+        ti = tarfile.TarInfo("./dist/report.txt")
+        ti.size = len(content)
+        tar.addfile(ti, io.BytesIO(content))
+
+    data = archive.getvalue()
+
+    container = Mock(ContainerRunner)
+    container.stream_command_output.return_value = iter([data[:1000], data[1000:]])
+
+    ArtifactManager(container, tmp_path.as_posix(), uuid.uuid4()).download(["dist/*"])
+
+    assert (tmp_path / "dist" / "report.txt").read_bytes() == b"all good"
+
+    (script,), _ = container.stream_command_output.call_args
+    assert "trap 'rm -f " in script
+
+
+def test_download_skips_extraction_if_no_artifacts_were_found(tmp_path: Path) -> None:
+    container = Mock(ContainerRunner)
+    container.stream_command_output.return_value = iter([])
+
+    ArtifactManager(container, tmp_path.as_posix(), uuid.uuid4()).download(["dist/*"])
+
+    container.stream_command_output.assert_called_once()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_download_only_logs_a_warning_if_collecting_the_artifacts_fails(
+    tmp_path: Path, caplog: LogCaptureFixture
+) -> None:
+    def failing_output() -> Iterator[bytes]:
+        yield b"\0" * 100
+        raise Exception("Command failed with exit code 2: tar: dist/report.txt: Permission denied")
+
+    container = Mock(ContainerRunner)
+    container.stream_command_output.return_value = failing_output()
+
+    ArtifactManager(container, tmp_path.as_posix(), uuid.uuid4()).download(["dist/*"])
+
+    assert "Error collecting artifacts: " in caplog.text
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_download_does_nothing_if_the_step_has_no_artifacts(tmp_path: Path) -> None:
+    container = Mock(ContainerRunner)
+
+    ArtifactManager(container, tmp_path.as_posix(), uuid.uuid4()).download([])
+
+    container.stream_command_output.assert_not_called()
@@ -3,9 +3,14 @@ import re
 from importlib.metadata import version
 from pathlib import Path
 
+import pytest
 from click.testing import CliRunner
+from docker.errors import DockerException  # type: ignore[import-untyped]
+from pytest_mock import MockerFixture
 
 from pipeline_runner.cli import main
+from pipeline_runner.config import Config, config
+from pipeline_runner.parse import PARSE_CACHE_FILE_NAME
 
 
 def test_specifying_no_command_shows_help() -> None:
@@ -27,6 +32,34 @@ def test_show_version() -> None:
     assert result.output == expected
 
 
+def test_cache_clear_removes_the_cache_of_every_project(user_cache_directory: Path) -> None:
+    for project in ("project-a", "project-b", "project-c"):
+        (user_cache_directory / project / "pip").mkdir(parents=True)
+        (user_cache_directory / project / "pip" / "cache.tar").write_bytes(b"data")
+
+    runner = CliRunner()
+
+    # noinspection PyTypeChecker
+    result = runner.invoke(main, ["cache", "clear"])
+
+    assert result.exit_code == 0
+    assert list(user_cache_directory.iterdir()) == []
+
+
+def test_cache_list_only_shows_project_directories(user_cache_directory: Path) -> None:
+    for project in ("project-b", "project-a"):
+        (user_cache_directory / project).mkdir(parents=True)
+    (user_cache_directory / "stray-file").write_text("")
+
+    runner = CliRunner()
+
+    # noinspection PyTypeChecker
+    result = runner.invoke(main, ["cache", "list"])
+
+    assert result.exit_code == 0
+    assert result.output == "Caches:\n\tproject-a\n\tproject-b\n"
+
+
 def test_list_pipelines(tmp_path_chdir: Path) -> None:
     with open(os.path.join(tmp_path_chdir, "bitbucket-pipelines.yml"), "w") as f:
         f.write(
@@ -94,3 +127,96 @@ def test_list_pipelines(tmp_path_chdir: Path) -> None:
     ]
 
     assert output_lines == expected
+
+
+def test_run_passes_pipeline_variables_to_the_runner(mocker: MockerFixture) -> None:
+    pipeline_runner = mocker.patch("pipeline_runner.runner.PipelineRunner")
+
+    runner = CliRunner()
+
+    # noinspection PyTypeChecker
+    result = runner.invoke(main, ["run", "custom.test", "--var", "FOO=bar=baz", "-v", "EMPTY="])
+
+    assert result.exit_code == 0
+
+    (req,), _ = pipeline_runner.call_args
+    assert req.variables == {"FOO": "bar=baz", "EMPTY": ""}
+
+
+def test_run_fails_if_pipeline_variables_are_invalid(mocker: MockerFixture) -> None:
+    pipeline_runner = mocker.patch("pipeline_runner.runner.PipelineRunner")
+
+    runner = CliRunner()
+
+    # noinspection PyTypeChecker
+    result = runner.invoke(main, ["run", "custom.test", "--var", "FOO"])
+
+    assert result.exit_code == 2
+    assert "expected NAME=VALUE, got: FOO" in result.output
+    pipeline_runner.assert_not_called()
+
+
+def test_run_fails_gracefully_if_docker_is_not_available(mocker: MockerFixture) -> None:
+    pipeline_runner = mocker.patch("pipeline_runner.runner.PipelineRunner")
+    pipeline_runner.side_effect = DockerException("Error while fetching server API version")
+    log_exception = mocker.patch("pipeline_runner.cli.logger.exception")
+
+    runner = CliRunner()
+
+    # noinspection PyTypeChecker
+    result = runner.invoke(main, ["run", "custom.test"])
+
+    assert result.exit_code == 1
+    log_exception.assert_called_once_with("Error running pipeline")
+
+
+def test_run_can_disable_image_prefetching(mocker: MockerFixture) -> None:
+    mocker.patch("pipeline_runner.runner.PipelineRunner")
+    mocker.patch.object(config, "prefetch_images", new=True)
+
+    runner = CliRunner()
+
+    # noinspection PyTypeChecker
+    result = runner.invoke(main, ["run", "custom.test", "--no-prefetch-images"])
+
+    assert result.exit_code == 0
+    assert config.prefetch_images is False
+
+
+@pytest.mark.parametrize("command", ["list", "parse"])
+def test_only_the_run_command_caches_the_parsed_pipelines_file(
+    tmp_path_chdir: Path, user_cache_directory: Path, mocker: MockerFixture, command: str
+) -> None:
+    # Other tests invoke `run`, which sets the config, make sure the default is in effect.
+    mocker.patch.object(config, "parse_cache", new=Config().parse_cache)
+
+    (tmp_path_chdir / "bitbucket-pipelines.yml").write_text(
+        """pipelines:
+  default:
+    - step:
+        script:
+          - "true"
+"""
+    )
+
+    runner = CliRunner()
+
+    # noinspection PyTypeChecker
+    result = runner.invoke(main, [command])
+
+    assert result.exit_code == 0
+    assert not any(user_cache_directory.rglob(PARSE_CACHE_FILE_NAME))
+
+
+@pytest.mark.parametrize(("option", "expected"), [([], True), (["--no-parse-cache"], False)])
+def test_run_parse_cache_can_be_disabled(mocker: MockerFixture, *, option: list[str], expected: bool) -> None:
+    mocker.patch("pipeline_runner.runner.PipelineRunner")
+    mocker.patch.object(config, "parse_cache", new=not expected)
+
+    runner = CliRunner()
+
+    # noinspection PyTypeChecker
+    result = runner.invoke(main, ["run", "custom.test", *option])
+
+    assert result.exit_code == 0
+    assert config.parse_cache is expected
@@ -1,27 +1,38 @@
 import base64
 import os
 from collections.abc import Callable
+from datetime import UTC, datetime, timedelta
 from unittest.mock import MagicMock
 
 import pytest
 from _pytest.logging import LogCaptureFixture
 from _pytest.monkeypatch import MonkeyPatch
 from docker import DockerClient  # type: ignore[import-untyped]
+from docker.errors import APIError, ImageNotFound  # type: ignore[import-untyped]
 from pytest_mock import MockerFixture
 
 from pipeline_runner.config import Config
 from pipeline_runner.container import (
     ContainerRunner,
+    ContainerScriptRunner,
     docker_is_docker_desktop,
     get_image_authentication,
     get_ssh_agent_socket_path,
+    pull_image,
 )
 from pipeline_runner.models import AwsCredentials, Image
 
 
 @pytest.fixture
 def aws_lib(mocker: MockerFixture) -> MagicMock:
-    return mocker.patch("pipeline_runner.container.boto3")
+    boto3: MagicMock = mocker.MagicMock()
+    mocker.patch.dict("sys.modules", {"boto3": boto3})
+    return boto3
+
+
+@pytest.fixture(autouse=True)
+def ecr_credentials_cache(mocker: MockerFixture) -> None:
+    mocker.patch.dict("pipeline_runner.container._ecr_credentials", clear=True)
 
 
 @pytest.fixture
@@ -82,6 +93,33 @@ def test_get_image_authentication_returns_credentials_from_aws_if_they_are_speci
     }
 
 
+def test_get_image_authentication_reuses_aws_credentials_until_they_expire(
+    aws_lib: MagicMock, mocker: MockerFixture
+) -> None:
+    access_key_id = "my-access-key-id"
+    secret_access_key = "my-secret-access-key"
+
+    auth_token = base64.b64encode(b"the-aws-username:the-aws-password").decode()
+    expires_at = datetime.now(tz=UTC) + timedelta(hours=12)
+
+    creds = AwsCredentials(access_key_id=access_key_id, secret_access_key=secret_access_key)
+    image = Image(name="alpine", aws=creds)
+
+    client = aws_lib.client.return_value
+    client.get_authorization_token.return_value = {
+        "authorizationData": [{"authorizationToken": auth_token, "expiresAt": expires_at}]
+    }
+
+    first = get_image_authentication(image)
+    assert get_image_authentication(image) == first
+    assert client.get_authorization_token.call_count == 1
+
+    mocker.patch("pipeline_runner.container.time", return_value=expires_at.timestamp())
+
+    assert get_image_authentication(image) == first
+    assert client.get_authorization_token.call_count == 2
+
+
 def test_aws_credentials_have_precedence(aws_lib: MagicMock) -> None:
     access_key_id = "my-access-key-id"
     secret_access_key = "my-secret-access-key"
@@ -107,6 +145,7 @@ def test_aws_credentials_have_precedence(aws_lib: MagicMock) -> None:
 
 def test_cpu_limits_are_not_applied_if_config_is_set_to_false(config: Config, mocker: MockerFixture) -> None:
     runner = ContainerRunner(
+        docker_client=mocker.Mock(),
         name="container",
         image=mocker.Mock(),
         network_name=None,
@@ -133,6 +172,7 @@ def test_cpu_limits_are_not_applied_if_config_is_set_to_false(config: Config, mo
 
 def test_cpu_limits_are_applied_if_config_is_set_to_true(config: Config, mocker: MockerFixture) -> None:
     runner = ContainerRunner(
+        docker_client=mocker.Mock(),
         name="container",
         image=mocker.Mock(),
         network_name=None,
@@ -157,6 +197,146 @@ def test_cpu_limits_are_applied_if_config_is_set_to_true(config: Config, mocker:
     assert kwargs["cpu_shares"] == 4096
 
 
+@pytest.fixture
+def pulled_images(mocker: MockerFixture) -> set[str]:
+    return mocker.patch("pipeline_runner.container._pulled_images", set())
+
+
+def test_pull_image_only_pulls_an_image_once(pulled_images: set[str]) -> None:
+    client = MagicMock(DockerClient)
+    image = Image(name="alpine")
+
+    pull_image(client, image)
+    pull_image(client, image)
+
+    client.images.pull.assert_called_once_with("alpine", auth_config=None)
+    assert pulled_images == {"alpine"}
+
+
+def test_pull_image_skips_images_pinned_by_digest_that_exist_locally(pulled_images: set[str]) -> None:
+    client = MagicMock(DockerClient)
+    image = Image(name=f"alpine@sha256:{'0' * 64}")
+
+    pull_image(client, image)
+
+    client.images.get.assert_called_once_with(image.name)
+    client.images.pull.assert_not_called()
+    assert pulled_images == {image.name}
+
+
+def test_pull_image_pulls_images_pinned_by_digest_that_do_not_exist_locally(pulled_images: set[str]) -> None:
+    client = MagicMock(DockerClient)
+    client.images.get.side_effect = ImageNotFound("not found")
+    image = Image(name=f"alpine@sha256:{'0' * 64}")
+
+    pull_image(client, image)
+
+    client.images.pull.assert_called_once_with(image.name, auth_config=None)
+    assert pulled_images == {image.name}
+
+
+def test_script_output_split_in_the_middle_of_a_character_is_decoded_properly(
+    mocker: MockerFixture, capsys: pytest.CaptureFixture[str]
+) -> None:
+    output = "héllo wörld".encode()
+    chunks = [(output[:2], b""), (output[2:9], b""), (output[9:], b"")]
+
+    runner = ContainerScriptRunner(mocker.Mock(), [])
+    runner._print_execution_log(iter(chunks))  # noqa: SLF001 Private member accessed
+
+    assert capsys.readouterr().out == "héllo wörld\n"
+
+
+def test_invalid_script_output_is_replaced_instead_of_failing(
+    mocker: MockerFixture, capsys: pytest.CaptureFixture[str]
+) -> None:
+    runner = ContainerScriptRunner(mocker.Mock(), [])
+    runner._print_execution_log(iter([(b"foo\xffbar", b"")]))  # noqa: SLF001 Private member accessed
+
+    assert capsys.readouterr().out == "foo\ufffdbar\n"
+
+
+@pytest.mark.parametrize("exit_code", [0, 2])
+def test_stream_command_output_yields_stdout_and_checks_the_exit_code(mocker: MockerFixture, exit_code: int) -> None:
+    docker_client = mocker.Mock()
+    api = docker_client.api
+    api.exec_create.return_value = {"Id": "exec-id"}
+    api.exec_start.return_value = iter([(b"foo", None), (None, b"oops"), (b"bar", None)])
+    api.exec_inspect.return_value = {"ExitCode": exit_code}
+
+    runner = ContainerRunner(
+        docker_client=docker_client,
+        name="container",
+        image=mocker.Mock(),
+        network_name=None,
+        repository_path="/some/path",
+        data_volume_name="data-volume",
+        env_vars={},
+        output_logger=mocker.Mock(),
+    )
+    mocker.patch.object(runner, "_container")
+
+    output = runner.stream_command_output("echo foo")
+
+    assert next(output) == b"foo"
+    assert next(output) == b"bar"
+
+    if exit_code:
+        with pytest.raises(Exception, match="Command failed with exit code 2: oops"):
+            next(output)
+    else:
+        assert next(output, None) is None
+
+    api.exec_start.assert_called_once_with("exec-id", stream=True, demux=True)
+
+
+@pytest.mark.parametrize(("user", "expected"), [(None, ""), (0, "0"), ("app", "app")])
+def test_stream_command_output_runs_the_command_as_the_requested_user(
+    mocker: MockerFixture, user: int | str | None, expected: str
+) -> None:
+    docker_client = mocker.Mock()
+    api = docker_client.api
+    api.exec_create.return_value = {"Id": "exec-id"}
+    api.exec_start.return_value = iter([])
+    api.exec_inspect.return_value = {"ExitCode": 0}
+
+    runner = ContainerRunner(
+        docker_client=docker_client,
+        name="container",
+        image=mocker.Mock(),
+        network_name=None,
+        repository_path="/some/path",
+        data_volume_name="data-volume",
+        env_vars={},
+        output_logger=mocker.Mock(),
+    )
+    mocker.patch.object(runner, "_container")
+
+    assert list(runner.stream_command_output("id -u", user=user)) == []
+
+    _, kwargs = api.exec_create.call_args
+    assert kwargs["user"] == expected
+
+
+def test_kill_ignores_containers_that_are_not_running(mocker: MockerFixture) -> None:
+    runner = ContainerRunner(
+        docker_client=mocker.Mock(),
+        name="container",
+        image=mocker.Mock(),
+        network_name=None,
+        repository_path="/some/path",
+        data_volume_name="data-volume",
+        env_vars={},
+        output_logger=mocker.Mock(),
+    )
+    container = mocker.patch.object(runner, "_container")
+    container.kill.side_effect = APIError("Container is not running")
+
+    runner.kill()
+
+    container.kill.assert_called_once_with()
+
+
 def test_get_ssh_agent_socket_path_returns_nothing_if_none_is_found(
     monkeypatch: MonkeyPatch,
     docker_is_docker_desktop_mock: MagicMock,
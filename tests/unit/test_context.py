@@ -1,9 +1,13 @@
 import os.path
 from pathlib import Path
+from unittest import mock
 from unittest.mock import Mock
 
+import pytest
+
+from pipeline_runner.config import DEFAULT_IMAGE
 from pipeline_runner.context import PipelineRunContext
-from pipeline_runner.models import CloneSettings, Image, ProjectMetadata, Service
+from pipeline_runner.models import CloneSettings, Image, ProjectMetadata, Service, Step
 
 
 def test_get_log_directory_returns_the_right_directory(
@@ -191,3 +195,118 @@ def test_default_caches_can_be_overridden(project_metadata: ProjectMetadata) ->
     }
 
     assert prc.caches == all_caches
+
+
+def test_all_steps_are_selected_if_no_selection_is_made(project_metadata: ProjectMetadata) -> None:
+    prc = PipelineRunContext(
+        pipeline_name="custom.test",
+        pipeline=Mock(),
+        caches={},
+        services={},
+        clone_settings=CloneSettings.empty(),
+        default_image=None,
+        project_metadata=project_metadata,
+        repository=Mock(),
+    )
+
+    assert prc.is_step_selected(Step(name="Step 1", script=["true"]))
+    assert prc.is_step_selected(Step(name="Step 2", script=["true"]))
+
+
+def test_only_selected_steps_are_selected(project_metadata: ProjectMetadata) -> None:
+    prc = PipelineRunContext(
+        pipeline_name="custom.test",
+        pipeline=Mock(),
+        caches={},
+        services={},
+        clone_settings=CloneSettings.empty(),
+        default_image=None,
+        project_metadata=project_metadata,
+        repository=Mock(),
+        selected_steps=["Step 2"],
+    )
+
+    assert not prc.is_step_selected(Step(name="Step 1", script=["true"]))
+    assert prc.is_step_selected(Step(name="Step 2", script=["true"]))
+
+
+def test_bitbucket_env_vars_are_only_computed_once(project_metadata: ProjectMetadata) -> None:
+    repository = Mock()
+    repository.get_current_branch.return_value = "master"
+    repository.get_current_commit.return_value = "abc123"
+
+    prc = PipelineRunContext(
+        pipeline_name="custom.test",
+        pipeline=Mock(),
+        caches={},
+        services={},
+        clone_settings=CloneSettings.empty(),
+        default_image=None,
+        project_metadata=project_metadata,
+        repository=repository,
+    )
+
+    env_vars = prc.bitbucket_env_vars
+
+    assert env_vars["BITBUCKET_BRANCH"] == "master"
+    assert env_vars["BITBUCKET_COMMIT"] == "abc123"
+    assert env_vars["BITBUCKET_BUILD_NUMBER"] == str(project_metadata.build_number)
+    assert env_vars["BITBUCKET_PIPELINE_UUID"] == str(prc.pipeline_uuid)
+
+    assert prc.bitbucket_env_vars is env_vars
+    repository.get_current_branch.assert_called_once()
+    repository.get_current_commit.assert_called_once()
+
+
+def test_load_env_vars_merges_env_files_in_order(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+
+    first = tmp_path / "first.env"
+    first.write_text("FOO=föö\nBAR=bar\n", encoding="utf-8")
+    second = tmp_path / "second.env"
+    second.write_text("BAR=baz\nEMPTY=\n")
+
+    with mock.patch.dict(os.environ):
+        env_vars = PipelineRunContext._load_env_vars([str(first), str(second)])  # noqa: SLF001 Private member accessed
+
+        assert os.environ["BAR"] == "baz"
+
+    assert env_vars == {"FOO": "föö", "BAR": "baz", "EMPTY": ""}
+
+
+def test_load_env_vars_raises_an_error_if_an_env_file_does_not_exist(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+
+    env_file = str(tmp_path / "missing.env")
+
+    with pytest.raises(ValueError, match=f"Invalid env file: {env_file}"):
+        PipelineRunContext._load_env_vars([env_file])  # noqa: SLF001 Private member accessed
+
+
+@pytest.mark.parametrize(
+    ("step_image", "default_image", "expected"),
+    [
+        (Image(name="step-image"), Image(name="default-image"), "step-image"),
+        (None, Image(name="default-image"), "default-image"),
+        (None, None, DEFAULT_IMAGE),
+    ],
+)
+def test_get_step_image_falls_back_to_the_default_images(
+    project_metadata: ProjectMetadata, step_image: Image | None, default_image: Image | None, expected: str
+) -> None:
+    prc = PipelineRunContext(
+        pipeline_name="custom.test",
+        pipeline=Mock(),
+        caches={},
+        services={},
+        clone_settings=CloneSettings.empty(),
+        default_image=default_image,
+        project_metadata=project_metadata,
+        repository=Mock(),
+    )
+
+    step = Step(name="Step", script=["true"], image=step_image)
+
+    assert prc.get_step_image(step).name == expected
@@ -8,6 +8,7 @@ from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import rsa
 from faker import Faker
 from pydantic import ValidationError
+from pytest_mock import MockerFixture
 
 from pipeline_runner import utils
 from pipeline_runner.models import (
@@ -21,6 +22,7 @@ from pipeline_runner.models import (
     PipelineResult,
     Pipelines,
     ProjectMetadata,
+    Repository,
     Step,
     StepWrapper,
 )
@@ -326,3 +328,19 @@ def test_project_metadata_load_from_file_fills_missing_values(user_data_director
 
     # Just make sure it loaded properly and we didn't get any validation errors
     ProjectMetadata.load_from_file(project_directory)
+
+
+def test_repository_only_asks_git_for_the_current_branch_and_commit_once(mocker: MockerFixture) -> None:
+    git_repo = mocker.Mock()
+    mocker.patch("pipeline_runner.models.Repo", return_value=git_repo)
+    type(git_repo.active_branch).name = branch = mocker.PropertyMock(return_value="master")
+    type(git_repo.head.commit).hexsha = commit = mocker.PropertyMock(return_value="abc123")
+
+    repository = Repository("/some/path")
+
+    for _ in range(3):
+        assert repository.get_current_branch() == "master"
+        assert repository.get_current_commit() == "abc123"
+
+    branch.assert_called_once()
+    commit.assert_called_once()
@@ -1,11 +1,16 @@
+import datetime as dt
+import json
+from pathlib import Path
 from textwrap import dedent
 from typing import Any
 
 import pytest
 import yaml
 from pydantic import ValidationError
+from pytest_mock import MockerFixture
 
 from pipeline_runner.config import config
+from pipeline_runner.errors import PipelinesFileNotFoundError
 from pipeline_runner.models import (
     AwsCredentials,
     Definitions,
@@ -24,6 +29,7 @@ from pipeline_runner.models import (
     Variable,
     Variables,
 )
+from pipeline_runner.parse import PARSE_CACHE_FILE_NAME, _load_pipeline_file, _write_cache_file, parse_pipeline_file
 
 
 def test_parse_empty_definitions() -> None:
@@ -274,6 +280,18 @@ def test_parse_pipeline_with_parallel_steps() -> None:
     assert pipeline == expected
 
 
+def test_parse_parallel_steps_with_fail_fast() -> None:
+    steps = [
+        {"step": {"name": "Parallel Step 1", "script": ["echo 'Parallel 1'"]}},
+        {"step": {"name": "Parallel Step 2", "script": ["echo 'Parallel 2'"]}},
+    ]
+
+    assert ParallelStep.model_validate({"parallel": {"fail-fast": True, "steps": steps}}).fail_fast is True
+    assert ParallelStep.model_validate({"parallel": {"fail-fast": False, "steps": steps}}).fail_fast is False
+    assert ParallelStep.model_validate({"parallel": {"steps": steps}}).fail_fast is False
+    assert ParallelStep.model_validate({"parallel": steps}).fail_fast is False
+
+
 def test_parse_pipeline_with_variables() -> None:
     spec = [
         {"variables": [{"name": "foo"}, {"name": "bar"}]},
@@ -639,3 +657,79 @@ def test_parse_pipeline_with_anchors() -> None:
     assert steps[0].step.name == "Build and test"
 
     assert model.pipelines.branches["develop"] == model.pipelines.branches["main"]
+
+
+def test_parse_pipeline_file_only_reloads_the_file_when_it_changes(tmp_path: Path, mocker: MockerFixture) -> None:
+    pipeline_file = tmp_path / "bitbucket-pipelines.yml"
+    pipeline_file.write_text("pipelines:\n  default:\n    - step:\n        script:\n          - echo foo\n")
+
+    yaml_load = mocker.spy(yaml, "load")
+
+    first = parse_pipeline_file(str(pipeline_file))
+    second = parse_pipeline_file(str(pipeline_file))
+
+    assert yaml_load.call_count == 1
+    assert first == second
+    assert first is not second
+
+    pipeline_file.write_text("pipelines:\n  default:\n    - step:\n        script:\n          - echo foobar\n")
+
+    third = parse_pipeline_file(str(pipeline_file))
+
+    assert yaml_load.call_count == 2
+    assert third != first
+
+
+def test_parse_pipeline_file_reuses_the_parsed_file_from_a_previous_run(
+    tmp_path: Path, user_cache_directory: Path, mocker: MockerFixture
+) -> None:
+    mocker.patch.object(config, "parse_cache", new=True)
+
+    pipeline_file = tmp_path / "bitbucket-pipelines.yml"
+    pipeline_file.write_text("pipelines:\n  default:\n    - step:\n        script:\n          - echo foo\n")
+
+    first = parse_pipeline_file(str(pipeline_file))
+
+    # Simulate a new run, with nothing cached in memory
+    _load_pipeline_file.cache_clear()
+    yaml_load = mocker.spy(yaml, "load")
+
+    assert parse_pipeline_file(str(pipeline_file)) == first
+    assert yaml_load.call_count == 0
+
+    (cache_file,) = user_cache_directory.glob(f"**/{PARSE_CACHE_FILE_NAME}")
+    assert json.loads(cache_file.read_text())["data"]["pipelines"]["default"][0]["step"]["script"] == ["echo foo"]
+
+
+@pytest.mark.parametrize("data", [{"date": dt.date(2024, 1, 1)}, {1: "non-string key"}])
+def test_parse_cache_skips_data_that_json_cannot_represent(tmp_path: Path, data: dict[Any, Any]) -> None:
+    cache_file = tmp_path / PARSE_CACHE_FILE_NAME
+
+    _write_cache_file(str(cache_file), {"key": ["bitbucket-pipelines.yml", 0, 0], "data": data})
+
+    assert not cache_file.exists()
+
+
+def test_parse_pipeline_file_does_not_cache_the_parsed_file_if_disabled(
+    tmp_path: Path, user_cache_directory: Path, mocker: MockerFixture
+) -> None:
+    mocker.patch.object(config, "parse_cache", new=False)
+
+    pipeline_file = tmp_path / "bitbucket-pipelines.yml"
+    pipeline_file.write_text("pipelines:\n  default:\n    - step:\n        script:\n          - echo foo\n")
+
+    parse_pipeline_file(str(pipeline_file))
+
+    _load_pipeline_file.cache_clear()
+    yaml_load = mocker.spy(yaml, "load")
+
+    parse_pipeline_file(str(pipeline_file))
+
+    assert yaml_load.call_count == 1
+    assert not list(user_cache_directory.glob(f"**/{PARSE_CACHE_FILE_NAME}"))
+
+
+@pytest.mark.parametrize("file_name", ["missing.yml", "."])
+def test_parse_pipeline_file_fails_if_the_file_does_not_exist(tmp_path: Path, file_name: str) -> None:
+    with pytest.raises(PipelinesFileNotFoundError):
+        parse_pipeline_file(str(tmp_path / file_name))
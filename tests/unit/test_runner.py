@@ -0,0 +1,354 @@
+import subprocess
+import sys
+import threading
+from collections.abc import Callable
+from unittest.mock import Mock
+
+import pytest
+from _pytest.logging import LogCaptureFixture
+from pytest_mock import MockerFixture
+
+from pipeline_runner.context import PipelineRunContext, StepRunContext
+from pipeline_runner.models import CloneSettings, Image, ParallelStep, Pipeline, ProjectMetadata, Service
+from pipeline_runner.runner import ParallelStepRunner, PipelineRunner, PipelineRunRequest, StepRunner
+
+
+@pytest.fixture
+def pipeline_run_context(project_metadata: ProjectMetadata) -> PipelineRunContext:
+    return PipelineRunContext(
+        pipeline_name="custom.test",
+        pipeline=Mock(),
+        caches={},
+        services={},
+        clone_settings=CloneSettings.empty(),
+        default_image=None,
+        project_metadata=project_metadata,
+        repository=Mock(),
+    )
+
+
+@pytest.fixture(autouse=True)
+def output_logger(mocker: MockerFixture) -> Mock:
+    return mocker.patch("pipeline_runner.utils.get_output_logger")
+
+
+def _parallel_step(step_count: int, *, fail_fast: bool = False) -> ParallelStep:
+    # All the steps have the same name to make sure they still get their own docker resources.
+    steps = [{"step": {"name": "Test", "script": ["true"]}} for _ in range(step_count)]
+
+    return ParallelStep.model_validate({"parallel": {"steps": steps, "fail-fast": fail_fast}})
+
+
+def test_parallel_steps_run_concurrently_with_their_own_resources(
+    pipeline_run_context: PipelineRunContext, project_metadata: ProjectMetadata, mocker: MockerFixture
+) -> None:
+    step_count = 3
+    # Every step waits for all the others to be started, which can only happen if they run at the same time.
+    barrier = threading.Barrier(step_count, timeout=5)
+    docker_client = Mock()
+
+    slugs = []
+
+    def run(runner: StepRunner) -> int:
+        barrier.wait()
+        slugs.append(runner._ctx.slug)  # noqa: SLF001 Private member accessed
+        runner._get_network()  # noqa: SLF001 Private member accessed
+        return 0
+
+    mocker.patch.object(StepRunner, "run", autospec=True, side_effect=run)
+
+    rc = ParallelStepRunner(_parallel_step(step_count), pipeline_run_context, docker_client).run()
+
+    assert rc == 0
+
+    expected_slugs = [f"{project_metadata.path_slug}-step-test-{i}" for i in range(step_count)]
+    assert sorted(slugs) == expected_slugs
+    assert sorted(c.args[0] for c in docker_client.networks.get.call_args_list) == [
+        f"{s}-network" for s in expected_slugs
+    ]
+
+
+def test_parallel_steps_return_the_last_failure_in_declaration_order(
+    pipeline_run_context: PipelineRunContext, mocker: MockerFixture
+) -> None:
+    return_codes = {0: 2, 1: 0, 2: 3}
+    last_step_done = threading.Event()
+
+    def run(runner: StepRunner) -> int:
+        idx = runner._ctx.parallel_step_index  # noqa: SLF001 Private member accessed
+        assert idx is not None
+
+        # The last step finishes first, so the completion order is the reverse of the declaration order.
+        if idx == len(return_codes) - 1:
+            last_step_done.set()
+        else:
+            last_step_done.wait(timeout=5)
+
+        return return_codes[idx]
+
+    mocker.patch.object(StepRunner, "run", autospec=True, side_effect=run)
+
+    rc = ParallelStepRunner(_parallel_step(len(return_codes)), pipeline_run_context, Mock()).run()
+
+    assert rc == 3
+
+
+def test_parallel_steps_with_fail_fast_stop_the_running_steps(
+    pipeline_run_context: PipelineRunContext, mocker: MockerFixture
+) -> None:
+    stopped = []
+
+    def run(runner: StepRunner) -> int | None:
+        idx = runner._ctx.parallel_step_index  # noqa: SLF001 Private member accessed
+        assert idx is not None
+
+        if idx == 0:
+            return 2
+
+        # The other steps run until they are told to stop.
+        if runner._stop_requested.wait(timeout=5):  # noqa: SLF001 Private member accessed
+            stopped.append(idx)
+            return None
+
+        return 0
+
+    mocker.patch.object(StepRunner, "run", autospec=True, side_effect=run)
+
+    rc = ParallelStepRunner(_parallel_step(3, fail_fast=True), pipeline_run_context, Mock()).run()
+
+    assert rc == 2
+    assert sorted(stopped) == [1, 2]
+
+
+def test_parallel_steps_are_stopped_if_the_group_is_interrupted(
+    pipeline_run_context: PipelineRunContext, mocker: MockerFixture
+) -> None:
+    stopped = []
+
+    def run(runner: StepRunner) -> int | None:
+        idx = runner._ctx.parallel_step_index  # noqa: SLF001 Private member accessed
+        assert idx is not None
+
+        if runner._stop_requested.wait(timeout=5):  # noqa: SLF001 Private member accessed
+            stopped.append(idx)
+            return None
+
+        return 0
+
+    mocker.patch.object(StepRunner, "run", autospec=True, side_effect=run)
+    # Ctrl-C raises in the main thread, which is waiting on the steps.
+    mocker.patch("pipeline_runner.runner.as_completed", side_effect=KeyboardInterrupt)
+
+    with pytest.raises(KeyboardInterrupt):
+        ParallelStepRunner(_parallel_step(3), pipeline_run_context, Mock()).run()
+
+    assert sorted(stopped) == [0, 1, 2]
+
+
+def test_step_runner_stop_kills_the_build_container(pipeline_run_context: PipelineRunContext) -> None:
+    step = _parallel_step(1)[0].step
+    runner = StepRunner(StepRunContext(step, pipeline_run_context), Mock())
+    container_runner = Mock()
+    runner._container_runner = container_runner  # noqa: SLF001 Private member accessed
+
+    runner.stop()
+
+    container_runner.kill.assert_called_once_with()
+
+
+def test_step_runner_creates_its_output_logger_only_when_run(
+    pipeline_run_context: PipelineRunContext, output_logger: Mock
+) -> None:
+    step = _parallel_step(1)[0].step
+
+    StepRunner(StepRunContext(step, pipeline_run_context), Mock())
+
+    output_logger.assert_not_called()
+
+
+@pytest.fixture
+def pipeline_runner(project_metadata: ProjectMetadata, mocker: MockerFixture) -> PipelineRunner:
+    pipeline = Pipeline.model_validate(
+        [
+            {"step": {"name": "Build", "image": "node:22", "script": ["true"]}},
+            {"step": {"name": "Lint", "script": ["true"]}},
+            {
+                "parallel": [
+                    {"step": {"name": "Unit", "image": "node:22", "script": ["true"]}},
+                    {"step": {"name": "Integration", "services": ["postgres"], "script": ["true"]}},
+                ]
+            },
+            {"step": {"name": "Deploy", "image": "deployer:latest", "script": ["true"]}},
+        ]
+    )
+    ctx = PipelineRunContext(
+        pipeline_name="custom.test",
+        pipeline=pipeline,
+        caches={},
+        services={"postgres": Service(image=Image(name="postgres:16"))},
+        clone_settings=CloneSettings.empty(),
+        default_image=Image(name="python:3.12"),
+        project_metadata=project_metadata,
+        repository=Mock(),
+        selected_steps=["Build", "Lint", "Unit", "Integration"],
+    )
+
+    mocker.patch("pipeline_runner.runner.PipelineRunContext.from_run_request", return_value=ctx)
+    mocker.patch("pipeline_runner.runner.docker.from_env")
+
+    return PipelineRunner(PipelineRunRequest("custom.test"))
+
+
+@pytest.fixture
+def variables_pipeline_runner_factory(
+    project_metadata: ProjectMetadata, mocker: MockerFixture
+) -> Callable[[dict[str, str]], PipelineRunner]:
+    pipeline = Pipeline.model_validate(
+        [
+            {
+                "variables": [
+                    {"name": "ENVIRONMENT", "default": "dev", "allowed-values": ["dev", "prod"]},
+                    {"name": "TAG"},
+                ]
+            },
+            {"step": {"name": "Build", "script": ["true"]}},
+        ]
+    )
+    ctx = PipelineRunContext(
+        pipeline_name="custom.test",
+        pipeline=pipeline,
+        caches={},
+        services={},
+        clone_settings=CloneSettings.empty(),
+        default_image=None,
+        project_metadata=project_metadata,
+        repository=Mock(),
+    )
+
+    mocker.patch("pipeline_runner.runner.PipelineRunContext.from_run_request", return_value=ctx)
+    mocker.patch("pipeline_runner.runner.docker.from_env")
+    mocker.patch.object(PipelineRunner, "_read_from_stdin", side_effect=AssertionError("Should not prompt"))
+
+    def factory(variables: dict[str, str]) -> PipelineRunner:
+        return PipelineRunner(PipelineRunRequest("custom.test", variables=variables))
+
+    return factory
+
+
+def test_provided_variables_are_not_prompted_for(
+    variables_pipeline_runner_factory: Callable[[dict[str, str]], PipelineRunner],
+) -> None:
+    runner = variables_pipeline_runner_factory({"ENVIRONMENT": "prod", "TAG": "v1"})
+
+    variables = runner._ask_for_variables()  # noqa: SLF001 Private member accessed
+
+    assert variables == {"ENVIRONMENT": "prod", "TAG": "v1"}
+
+
+def test_empty_provided_variables_use_their_default_value(
+    variables_pipeline_runner_factory: Callable[[dict[str, str]], PipelineRunner],
+) -> None:
+    runner = variables_pipeline_runner_factory({"ENVIRONMENT": "", "TAG": ""})
+
+    variables = runner._ask_for_variables()  # noqa: SLF001 Private member accessed
+
+    assert variables == {"ENVIRONMENT": "dev", "TAG": ""}
+
+
+def test_provided_variables_must_be_one_of_the_allowed_values(
+    variables_pipeline_runner_factory: Callable[[dict[str, str]], PipelineRunner],
+) -> None:
+    runner = variables_pipeline_runner_factory({"ENVIRONMENT": "staging", "TAG": "v1"})
+
+    with pytest.raises(ValueError, match="Invalid value for ENVIRONMENT: staging"):
+        runner._ask_for_variables()  # noqa: SLF001 Private member accessed
+
+
+def test_provided_variables_not_defined_by_the_pipeline_are_ignored(
+    variables_pipeline_runner_factory: Callable[[dict[str, str]], PipelineRunner], caplog: LogCaptureFixture
+) -> None:
+    runner = variables_pipeline_runner_factory({"ENVIRONMENT": "prod", "TAG": "v1", "UNKNOWN": "value"})
+
+    variables = runner._ask_for_variables()  # noqa: SLF001 Private member accessed
+
+    assert variables == {"ENVIRONMENT": "prod", "TAG": "v1"}
+    assert "Ignoring variable not defined in pipeline: UNKNOWN" in caplog.text
+
+
+def test_prefetch_images_pulls_the_images_of_the_selected_steps_and_their_services(
+    pipeline_runner: PipelineRunner, mocker: MockerFixture
+) -> None:
+    pull_image = mocker.patch("pipeline_runner.runner.pull_image")
+    thread_start = mocker.patch("pipeline_runner.runner.threading.Thread.start", autospec=True)
+
+    pipeline_runner._prefetch_images()  # noqa: SLF001 Private member accessed
+
+    for call in thread_start.call_args_list:
+        call.args[0].run()
+
+    assert sorted(c.args[1].name for c in pull_image.call_args_list) == ["node:22", "postgres:16", "python:3.12"]
+
+
+_BLOCKED_PREFETCH_SCRIPT = """
+import sys
+import threading
+from unittest import mock
+
+from pipeline_runner.models import Image
+from pipeline_runner.runner import PipelineRunner, PipelineRunRequest
+
+with (
+    mock.patch("pipeline_runner.runner.PipelineRunContext.from_run_request"),
+    mock.patch("pipeline_runner.runner.docker.from_env"),
+):
+    runner = PipelineRunner(PipelineRunRequest("custom.test"))
+
+pull_started = threading.Event()
+
+def pull_image(*_):
+    pull_started.set()
+    threading.Event().wait()
+
+with (
+    mock.patch("pipeline_runner.runner.pull_image", side_effect=pull_image),
+    mock.patch.object(runner, "_get_pipeline_images", return_value=[Image(name="alpine")]),
+    mock.patch.object(runner, "_ask_for_variables", return_value={}),
+    mock.patch.object(runner, "_execute_pipeline", side_effect=lambda: pull_started.wait() and 0),
+):
+    result = runner.run()
+
+sys.exit(result.exit_code)
+"""
+
+
+def test_process_exits_while_an_image_is_still_being_prefetched(pytestconfig: pytest.Config) -> None:
+    # The pull never finishes: the process can only exit if nothing waits for it.
+    proc = subprocess.run(  # noqa: S603 `subprocess` call: check for execution of untrusted input
+        [sys.executable, "-c", _BLOCKED_PREFETCH_SCRIPT],
+        cwd=pytestconfig.rootpath,
+        capture_output=True,
+        timeout=30,
+        check=False,
+    )
+
+    assert proc.returncode == 0, proc.stderr.decode()
+
+
+def test_step_runner_stops_its_output_logger_after_releasing_its_resources(
+    pipeline_run_context: PipelineRunContext, mocker: MockerFixture
+) -> None:
+    step = _parallel_step(1)[0].step
+    runner = StepRunner(StepRunContext(step, pipeline_run_context), Mock())
+    services_manager = Mock()
+    services_manager.stop_services.side_effect = Exception("Service failed to stop")
+    runner._services_manager = services_manager  # noqa: SLF001 Private member accessed
+    runner._output_logger = Mock()  # noqa: SLF001 Private member accessed
+
+    calls = Mock()
+    calls.attach_mock(services_manager.stop_services, "stop_services")
+    calls.attach_mock(mocker.patch("pipeline_runner.utils.stop_output_logger"), "stop_output_logger")
+
+    with pytest.raises(Exception, match="Service failed to stop"):
+        runner._release_resources(None)  # noqa: SLF001 Private member accessed
+
+    assert [c[0] for c in calls.mock_calls] == ["stop_services", "stop_output_logger"]
@@ -0,0 +1,40 @@
+import pytest
+from docker.errors import NotFound  # type: ignore[import-untyped]
+from pytest_mock import MockerFixture
+
+from pipeline_runner.models import Image, Service
+from pipeline_runner.service import DockerServiceRunner
+
+
+@pytest.mark.parametrize(
+    ("parallel_step_index", "volume_name"),
+    [
+        (None, "project-service-docker-cache"),
+        (1, "project-service-docker-cache-1"),
+    ],
+)
+def test_docker_service_cache_volume_is_shared_except_by_parallel_steps(
+    mocker: MockerFixture, parallel_step_index: int | None, volume_name: str
+) -> None:
+    docker_client = mocker.Mock()
+    docker_client.volumes.get.side_effect = NotFound("No such volume")
+
+    runner = DockerServiceRunner(
+        docker_client,
+        "docker",
+        Service(image=Image(name="docker:dind")),
+        "network",
+        "data-volume",
+        "project-step-build",
+        "project",
+        "/cache",
+        parallel_step_index,
+    )
+
+    volume = runner._get_cache_volume()  # noqa: SLF001 Private member accessed
+
+    assert volume is docker_client.volumes.create.return_value
+    docker_client.volumes.get.assert_called_once_with(volume_name)
+    docker_client.volumes.create.assert_called_once_with(
+        volume_name, labels={"org.acidrain.pipeline_runner.project": "project"}
+    )
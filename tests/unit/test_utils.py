@@ -1,16 +1,22 @@
+import os.path
 import tarfile
 from io import BytesIO
 from pathlib import Path
 
 import pytest
+from pytest_mock import MockerFixture
 
 from pipeline_runner.errors import NegativeIntegerError
 from pipeline_runner.utils import (
+    FileStreamer,
     PathTraversalError,
+    Timer,
     ensure_directory,
     escape_shell_string,
     get_human_readable_size,
+    get_output_logger,
     safe_extract_tar,
+    stop_output_logger,
     stringify,
 )
 
@@ -26,6 +32,22 @@ def test_ensure_directory(tmp_path: Path) -> None:
     assert target.exists()
 
 
+def test_ensure_directory_does_not_fail_if_the_directory_was_created_concurrently(
+    tmp_path: Path, mocker: MockerFixture
+) -> None:
+    target = tmp_path / "foo"
+    target.mkdir()
+
+    # Simulate another thread creating the directory between the check and the creation: the first check misses it,
+    # every other one, including any made by `os.makedirs`, sees the real filesystem.
+    isdir = os.path.isdir
+    checks = iter([False])
+    mocker.patch("os.path.isdir", side_effect=lambda path: next(checks, isdir(path)))
+
+    assert ensure_directory(target.as_posix()) == target.as_posix()
+    assert target.is_dir()
+
+
 @pytest.mark.parametrize(
     ("value", "expected"),
     [
@@ -130,3 +152,59 @@ def test_safe_extract_tar_raises_on_files_outside_of_dir(tmp_path: Path) -> None
         pytest.raises(PathTraversalError),
     ):
         safe_extract_tar(tar, str(tmp_path))
+
+
+def test_output_logger_writes_all_records_to_its_file_once_stopped(tmp_path: Path) -> None:
+    output_logger = get_output_logger(str(tmp_path), "some-step")
+
+    for i in range(100):
+        output_logger.info("line %d\n", i)
+
+    stop_output_logger(output_logger)
+
+    assert (tmp_path / "some-step.txt").read_text() == "".join(f"line {i}\n" for i in range(100))
+    assert output_logger.handlers == []
+
+
+def test_output_logger_only_writes_each_record_once_when_reused(tmp_path: Path) -> None:
+    first_dir = tmp_path / "first"
+    second_dir = tmp_path / "second"
+    first_dir.mkdir()
+    second_dir.mkdir()
+
+    get_output_logger(str(first_dir), "some-step")
+    output_logger = get_output_logger(str(second_dir), "some-step")
+
+    output_logger.info("some line\n")
+
+    stop_output_logger(output_logger)
+
+    assert (first_dir / "some-step.txt").read_text() == ""
+    assert (second_dir / "some-step.txt").read_text() == "some line\n"
+    assert not output_logger.propagate
+
+
+@pytest.mark.parametrize("read_size", [1, 3, 512, 4096])
+def test_file_streamer_reads_across_chunk_boundaries(read_size: int) -> None:
+    chunks = [b"abc", b"", b"defghij", b"k" * 1000, b"lmnop"]
+    expected = b"".join(chunks)
+
+    streamer = FileStreamer(iter(chunks))  # type: ignore[abstract]
+
+    data = b""
+    while part := streamer.read(read_size):
+        assert len(part) <= read_size
+        data += part
+
+    assert data == expected
+    assert streamer.read(read_size) == b""
+
+
+def test_timer_measures_the_time_elapsed_since_its_creation(mocker: MockerFixture) -> None:
+    perf_counter = mocker.patch("pipeline_runner.utils.perf_counter", side_effect=[10.0, 12.5, 13.0])
+
+    timer = Timer()
+
+    assert timer.elapsed == 2.5
+    assert timer.elapsed == 3.0
+    assert perf_counter.call_count == 3